@@ -0,0 +1,136 @@
+import threading
+
+
+# Quality levels from most thorough to cheapest. min_size is a fraction of
+# the frame width, detection_max_width None keeps the full resolution.
+LEVELS = (
+    {
+        "scale_factor": 1.05,
+        "min_neighbors": 5,
+        "detection_max_width": None,
+        "min_size": 0.0,
+    },
+    {
+        "scale_factor": 1.1,
+        "min_neighbors": 5,
+        "detection_max_width": None,
+        "min_size": 0.0,
+    },
+    {
+        "scale_factor": 1.2,
+        "min_neighbors": 4,
+        "detection_max_width": 960,
+        "min_size": 0.02,
+    },
+    {
+        "scale_factor": 1.3,
+        "min_neighbors": 4,
+        "detection_max_width": 640,
+        "min_size": 0.04,
+    },
+    {
+        "scale_factor": 1.5,
+        "min_neighbors": 3,
+        "detection_max_width": 480,
+        "min_size": 0.06,
+    },
+    {
+        "scale_factor": 1.8,
+        "min_neighbors": 3,
+        "detection_max_width": 320,
+        "min_size": 0.08,
+    },
+)
+
+
+class LatencyAutoTuner:
+    # Moves the detection settings along LEVELS to keep the cascade time near
+    # target_ms. Timings are smoothed, a level only changes after the budget
+    # has been missed (or beaten by a wide margin) for several frames in a
+    # row, and the frames right after a change are not counted, so it settles
+    # instead of oscillating between two levels.
+    def __init__(
+        self,
+        settings,
+        target_ms=33.0,
+        level=2,
+        smoothing=0.3,
+        slower=1.15,
+        faster=0.6,
+        slower_frames=3,
+        faster_frames=15,
+        cooldown_frames=5,
+    ):
+        self.settings = settings
+        self.target_ms = target_ms
+        self.level = min(max(level, 0), len(LEVELS) - 1)
+        self.smoothing = smoothing
+        self.slower = slower
+        self.faster = faster
+        self.slower_frames = slower_frames
+        self.faster_frames = faster_frames
+        self.cooldown_frames = cooldown_frames
+        self.lock = threading.Lock()
+        self.frame_width = None
+        self.reset()
+
+    def reset(self):
+        self.average_ms = None
+        self.over = 0
+        self.under = 0
+        self.cooldown = self.cooldown_frames
+
+    def set_target_ms(self, target_ms):
+        with self.lock:
+            self.target_ms = target_ms
+            self.reset()
+
+    def apply(self):
+        values = LEVELS[self.level]
+        self.settings.set_scale_factor(values["scale_factor"])
+        self.settings.set_min_neighbors(values["min_neighbors"])
+        self.settings.set_detection_max_width(values["detection_max_width"])
+        min_size = None
+        if values["min_size"] and self.frame_width:
+            side = max(1, round(self.frame_width * values["min_size"]))
+            min_size = (side, side)
+        self.settings.set_min_size(min_size)
+
+    def observe(self, elapsed_ms, frame_width):
+        with self.lock:
+            if frame_width != self.frame_width:
+                # min_size depends on the frame, re-apply for a new source
+                self.frame_width = frame_width
+                self.apply()
+                self.reset()
+                return
+            if self.cooldown > 0:
+                self.cooldown -= 1
+                return
+            if self.average_ms is None:
+                self.average_ms = elapsed_ms
+            else:
+                self.average_ms += self.smoothing * (elapsed_ms - self.average_ms)
+
+            if self.average_ms > self.target_ms * self.slower:
+                self.over += 1
+                self.under = 0
+            elif self.average_ms < self.target_ms * self.faster:
+                self.under += 1
+                self.over = 0
+            else:
+                self.over = 0
+                self.under = 0
+
+            if self.over >= self.slower_frames and self.level < len(LEVELS) - 1:
+                self.level += 1
+            elif self.under >= self.faster_frames and self.level > 0:
+                self.level -= 1
+            else:
+                return
+            self.apply()
+            self.reset()
+
+    def status(self):
+        average = "-" if self.average_ms is None else f"{self.average_ms:.0f}"
+        return f"level {self.level}, {average}/{self.target_ms:.0f} ms"
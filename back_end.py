@@ -1,121 +1,376 @@
+import os
+import queue
+from collections import OrderedDict, deque
 import cv2
-from PySide6.QtGui import QImage
-from PySide6.QtCore import Qt, Signal, QThread, QTimer
-import serial
+from PySide6.QtCore import Signal, QThread
+from capture import (
+    VIDEO_EXTENSIONS,
+    CameraPool,
+    CaptureThread,
+    FramePool,
+    FrameRingBuffer,
+    VideoFileReader,
+)
+from image_processing import ImageProcessing
+from qt_adapter import DisplayPipeline
+from recorder import Recorder
+from telemetry import TelemetryWriter, SerialSink
 
 
-class ImageProcessing:
-    def __init__(self) -> None:
-        self.face_cascade = cv2.CascadeClassifier("haarcascade_frontalface_default.xml")
-        self.eye_cascade = cv2.CascadeClassifier("haarcascade_eye.xml")
-        self.model = "faces"
-        self.image_color = "rgb"
-        self.scale_factor = 1.5
-        self.min_neighbors = 5
+def array_bytes(value):
+    # bytes held by the arrays in a cache entry, nested tuples included
+    if isinstance(value, (tuple, list)):
+        return sum(array_bytes(item) for item in value)
+    return getattr(value, "nbytes", 0)
 
-    def set_image_color(self, image_color):
-        self.image_color = image_color
 
-    def set_model(self, model):
-        self.model = model
+class LRUCache:
+    # entries are decoded or annotated frames, so besides their number the
+    # bytes they hold are bounded too; the newest entry is always kept
+    def __init__(self, max_size=16, max_bytes=None):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.sizes = {}
+        self.total_bytes = 0
 
-    def set_scale_factor(self, scale_factor):
-        self.scale_factor = scale_factor
+    def get(self, key):
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
 
-    def set_min_neighbors(self, min_neighbors):
-        self.min_neighbors = min_neighbors
+    def put(self, key, value):
+        if key in self.entries:
+            self.total_bytes -= self.sizes[key]
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        self.sizes[key] = array_bytes(value)
+        self.total_bytes += self.sizes[key]
+        while len(self.entries) > 1 and (
+            len(self.entries) > self.max_size
+            or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+        ):
+            old_key, _ = self.entries.popitem(last=False)
+            self.total_bytes -= self.sizes.pop(old_key)
 
-    def cv_to_qt_image(self, cv_image):
-        height, width = cv_image.shape[:2]
-
-        if len(cv_image.shape) == 2:  # Grayscale image
-            bytes_per_line = width
-            q_image = QImage(
-                cv_image.data, width, height, bytes_per_line, QImage.Format_Grayscale8
-            )
-        elif len(cv_image.shape) == 3:  # RGB image
-            bytes_per_line = 3 * width
-            q_image = QImage(
-                cv_image.data, width, height, bytes_per_line, QImage.Format_BGR888
-            )
-        else:
-            raise ValueError("Unsupported image format")
-
-        return q_image
-
-    def detect_faces(self, cv_image):
-        faces = self.face_cascade.detectMultiScale(
-            cv_image, self.scale_factor, self.min_neighbors
-        )
-        for x, y, w, h in faces:
-            cv2.rectangle(cv_image, (x, y), (x + w, y + h), (255, 0, 0), 2)
-
-        return len(faces), self.cv_to_qt_image(cv_image)
-
-    def detect_eyes(self, cv_image):
-        eyes = self.eye_cascade.detectMultiScale(
-            cv_image, self.scale_factor, self.min_neighbors
-        )
-        for x, y, w, h in eyes:
-            cv2.rectangle(cv_image, (x, y), (x + w, y + h), (255, 0, 0), 2)
-
-        return len(eyes), self.cv_to_qt_image(cv_image)
-
-    def process_image(self, cv_image):
-        if self.image_color == "gray":
-            cv_image = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-        elif self.image_color != "rgb":
-            print(
-                f"Warning: Unrecognized color format {self.image_color}. Using default (RGB)."
-            )
-
-        if self.model == "faces":
-            return self.detect_faces(cv_image)
-        elif self.model == "eyes":
-            return self.detect_eyes(cv_image)
-        else:
-            print(
-                f"Warning: Unrecognized model type {self.model}. Using default (faces)."
-            )
-            return 0, self.cv_to_qt_image(cv_image)
+    def clear(self):
+        self.entries.clear()
+        self.sizes.clear()
+        self.total_bytes = 0
 
 
 class UpdateImageThread(QThread):
-    frameCaptured = Signal(int, QImage)
+    # emitted only when the display mailbox goes from empty to full
+    frameReady = Signal()
 
     def __init__(self):
         super().__init__()
         self.image_processing = ImageProcessing()
         self.acquisition_local = None
+        self.camera_source = 0
         self.file_path = None
         self.n = 0
-        self.serial_timer = QTimer(self)
-        self.serial_timer.timeout.connect(self.send_serial_data)
-        self.serial_timer.start(1500)
-        try:
-            self.serial = serial.Serial("COM10", 57600)
-        except:
-            self.serial = None
-            print("erro ao abrir portal serial")
+        self.frame_cache = LRUCache(max_size=8, max_bytes=256 * 1024 * 1024)
+        self.result_cache = LRUCache(max_size=8, max_bytes=256 * 1024 * 1024)
+        self.display_pipeline = DisplayPipeline()
+        self.idle_interval_ms = 50
+        # camera and video frames are decoded into pooled arrays and given
+        # back once shown or dropped
+        self.new_frame_buffers()
+        # sources and settings change through this queue, between frames
+        self.commands = queue.Queue()
+        self.camera_pool = CameraPool()
+        self.capture_thread = None
+        self.last_key = None
+        self.video_reader = None
+        self.video_realtime = True
+        # position in the video file of the frame being emitted
+        self.frame_index = None
+        self.frame_timestamp_ms = None
+        self.pending_positions = deque()
+        self.recorder = None
+        # counts go out from the telemetry thread; a dead port never blocks us
+        self.telemetry = TelemetryWriter(SerialSink("COM10", 57600))
+        self.telemetry.start()
 
     def stop(self):
         self.requestInterruption()
+        self.commands.put(None)
         self.wait()
+        # on the way out the files have to be finished and the sink closed
+        self.stop_recording(wait=True)
+        self.telemetry.stop()
+
+    # ----- commands, safe to call from any thread -----
+    def open_file(self, path):
+        extension = os.path.splitext(path)[1].lower()
+        kind = "video" if extension in VIDEO_EXTENSIONS else "filesystem"
+        self.commands.put(("source", kind, path))
+
+    def open_camera(self, index=0):
+        self.commands.put(("source", "webcam", index))
+
+    def close_source(self):
+        self.commands.put(("source", None, None))
+
+    def configure(self, **calls):
+        # ImageProcessing setters by name, e.g. configure(set_model="eyes");
+        # one call's changes land together, between two frames
+        self.commands.put(("configure", calls))
+
+    def start_recording(self, prefix, **options):
+        self.stop_recording()
+        if "fps" not in options and self.video_reader is not None:
+            options["fps"] = self.video_reader.fps
+        recorder = Recorder(prefix, **options)
+        recorder.start()
+        self.recorder = recorder
+
+    def stop_recording(self, wait=False):
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            recorder.stop(wait)
+
+    def set_video_realtime(self, realtime):
+        # real time drops late frames, otherwise every frame is processed
+        self.video_realtime = realtime
+        if self.video_reader is not None:
+            self.video_reader.set_realtime(realtime)
+
+    def seek(self, timestamp_ms):
+        if self.video_reader is not None:
+            self.video_reader.seek(timestamp_ms)
+
+    def seek_by(self, delta_ms):
+        self.seek((self.frame_timestamp_ms or 0.0) + delta_ms)
+
+    def apply_commands(self, timeout=0.0):
+        # waits up to timeout for the first command, then drains the rest
+        try:
+            if timeout:
+                command = self.commands.get(timeout=timeout)
+            else:
+                command = self.commands.get_nowait()
+        except queue.Empty:
+            return
+        while command is not None:
+            if command[0] == "source":
+                self.switch_source(command[1], command[2])
+            elif command[0] == "configure":
+                for name, value in command[1].items():
+                    getattr(self.image_processing, name)(value)
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                return
+
+    def new_frame_buffers(self):
+        # one pool and buffer per source: a capture thread that outlives its
+        # stop() keeps writing to the old ones, which nobody reads any more
+        self.frame_pool = FramePool()
+        self.frame_buffer = FrameRingBuffer(capacity=2, on_drop=self.frame_pool.release)
+
+    def switch_source(self, kind, target):
+        self.release_source()
+        self.new_frame_buffers()
+        self.acquisition_local = kind
+        self.last_key = None
+        if kind == "filesystem":
+            self.file_path = target
+            self.image_processing.set_source(target)
+        elif kind == "video":
+            self.file_path = target
+            self.image_processing.set_source(target)
+            self.video_reader = VideoFileReader(
+                target, realtime=self.video_realtime, frame_pool=self.frame_pool
+            )
+            if not self.video_reader.is_opened():
+                print(f"Warning: Could not open video {target}.")
+                self.video_reader = None
+                self.acquisition_local = None
+                return
+            self.video_reader.start()
+        elif kind == "webcam":
+            self.camera_source = target
+            self.image_processing.set_source(f"camera {target}")
+            camera = self.camera_pool.acquire(target)
+            if camera is None:
+                print(f"Warning: Could not open camera {target}.")
+                self.acquisition_local = None
+                return
+            self.capture_thread = CaptureThread(
+                camera, self.frame_buffer, frame_pool=self.frame_pool
+            )
+            self.capture_thread.start()
+
+    def release_source(self):
+        if self.capture_thread is not None:
+            stopped = self.capture_thread.stop()
+            self.capture_thread = None
+            # stays open for a while, switching back is instant; a camera
+            # still read by a stuck thread is closed instead
+            if not stopped:
+                print(f"Warning: Camera {self.camera_source} did not stop, closing it.")
+            self.camera_pool.release(self.camera_source, keep_warm=stopped)
+        if self.video_reader is not None:
+            self.video_reader.stop()
+            self.video_reader = None
+        # frames of the old source still in the pool are dropped
+        self.image_processing.flush()
+        for _, frame in self.pending_positions:
+            self.frame_pool.release(frame)
+        self.pending_positions.clear()
+        self.acquisition_local = None
 
     def run(self):
-        web_cam = cv2.VideoCapture(0)
+        self.display_pipeline.reset()
         while not self.isInterruptionRequested():
-            if self.acquisition_local == "webcam":
-                _, frame = web_cam.read()
-            elif self.acquisition_local == "filesystem":
-                frame = cv2.imread(self.file_path)
-            if frame is not None:
-                self.n, processed_image = self.image_processing.process_image(frame)
-                self.frameCaptured.emit(
-                    self.n, processed_image.scaled(1000, 800, Qt.KeepAspectRatio)
+            self.apply_commands()
+            self.camera_pool.expire()
+            if self.acquisition_local is None:
+                self.apply_commands(timeout=self.idle_interval_ms / 1000)
+                continue
+
+            if self.acquisition_local == "filesystem":
+                key = self.file_cache_key()
+                if key is not None:
+                    key = (key, self.display_pipeline.target_size)
+                # static image: only redraw when the file, a parameter or the
+                # display size changes
+                if key is None or key == self.last_key:
+                    self.apply_commands(timeout=self.idle_interval_ms / 1000)
+                    continue
+                self.last_key = key
+                self.frame_index, self.frame_timestamp_ms = None, None
+                self.n, processed_image = self.process_file(key[0])
+                if processed_image is not None:
+                    self.emit_frame(processed_image)
+                continue
+
+            frame = None
+            position = (None, None)
+            if self.acquisition_local == "video":
+                with self.image_processing.profiler.stage("capture"):
+                    item = self.video_reader.next_frame(timeout=0.1)
+                if item is not None:
+                    index, timestamp_ms, frame = item
+                    position = (index, timestamp_ms)
+            elif self.acquisition_local == "webcam":
+                with self.image_processing.profiler.stage("capture"):
+                    _, frame = self.frame_buffer.get_latest(timeout=0.1)
+            if frame is None:
+                # at the end of a video or while the camera stalls, frames
+                # already detected by the pool still go out
+                if self.image_processing.executor is not None:
+                    self.emit_finished()
+                continue
+            if self.image_processing.executor is None:
+                self.n, processed_image = self.image_processing.process_image(
+                    frame, reuse_output=True
                 )
+                self.frame_index, self.frame_timestamp_ms = position
+                self.emit_frame(processed_image)
+                # the display and the recorder have their own copies by now
+                self.frame_pool.release(frame)
+                continue
+
+            # the pool returns frames in submission order, so positions follow
+            self.image_processing.submit_frame(frame)
+            self.pending_positions.append((position, frame))
+            self.emit_finished()
+
+        self.release_source()
+        self.camera_pool.close_all()
+
+    def emit_finished(self):
+        for n, processed_image in self.image_processing.finished_frames():
+            self.n = n
+            position, done = self.pending_positions.popleft()
+            self.frame_index, self.frame_timestamp_ms = position
+            self.emit_frame(processed_image)
+            self.frame_pool.release(done)
 
-    def send_serial_data(self):
-        if self.serial:
-            data_to_send = f"N {self.image_processing.model}: {self.n}"
-            self.serial.write(data_to_send.encode())
+    def emit_frame(self, cv_image):
+        self.telemetry.publish(self.image_processing.model, self.n)
+        recorder = self.recorder
+        if recorder is not None:
+            recorder.record(
+                cv_image,
+                self.image_processing.model,
+                self.image_processing.last_results,
+                self.frame_index,
+                self.frame_timestamp_ms,
+            )
+        with self.image_processing.profiler.stage("resize"):
+            needs_signal = self.display_pipeline.post(
+                self.n, cv_image, self.frame_timestamp_ms
+            )
+        if needs_signal:
+            self.frameReady.emit()
+        self.image_processing.profiler.frame_done()
+
+    def frame_stats(self):
+        stats = self.frame_buffer.stats()
+        for name, value in self.frame_pool.stats().items():
+            stats[f"pool_{name}"] = value
+        # called from the GUI thread, the reader may go away meanwhile
+        video_reader = self.video_reader
+        if video_reader is not None:
+            for name, value in video_reader.stats().items():
+                stats[f"video_{name}"] = value
+        return stats
+
+    def file_cache_key(self):
+        try:
+            mtime = os.stat(self.file_path).st_mtime_ns
+        except (OSError, TypeError):
+            return None
+        image_processing = self.image_processing
+        return (
+            self.file_path,
+            mtime,
+            image_processing.model,
+            image_processing.image_color,
+            image_processing.scale_factor,
+            image_processing.min_neighbors,
+            image_processing.detection_max_width,
+            image_processing.detection_scale,
+            image_processing.min_size,
+            image_processing.max_size,
+            image_processing.rois.get(self.file_path),
+            image_processing.equalization,
+            image_processing.tiling,
+        )
+
+    def process_file(self, key):
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            # the recorder and the sidecar read the boxes from last_results
+            n, processed_image, results = cached
+            self.image_processing.last_results = results
+            return n, processed_image
+
+        tiling = self.image_processing.tiling
+        frame_key = key[:2] + (tiling is not None and tiling.reduce,)
+        cached = self.frame_cache.get(frame_key)
+        if cached is None:
+            with self.image_processing.profiler.stage("imread"):
+                frame = cv2.imread(self.file_path)
+                reduced = None
+                if frame is not None and tiling is not None and tiling.applies(frame):
+                    reduced = tiling.read_reduced(self.file_path)
+            if frame is None:
+                return 0, None
+            cached = (frame, reduced)
+            self.frame_cache.put(frame_key, cached)
+        frame, reduced = cached
+
+        # detection draws on the frame, so keep the cached decode untouched
+        n, processed_image = self.image_processing.process_image(
+            frame.copy(), reduced=reduced
+        )
+        self.result_cache.put(
+            key, (n, processed_image, self.image_processing.last_results)
+        )
+        return n, processed_image
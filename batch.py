@@ -0,0 +1,269 @@
+# Headless face/eye detection over directories, globs and video files.
+# Never imports PySide6, so it runs on servers without a display:
+#   python batch.py photos/ "clips/*.mp4" --model faces --output results.jsonl
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import time
+import cv2
+from capture import VIDEO_EXTENSIONS
+from detection import MODELS
+from image_processing import ImageProcessing
+
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp"}
+FIELDS = ["file", "frame", "count", "boxes", "latency_ms"]
+
+image_processing = None
+
+
+def collect_inputs(patterns):
+    files = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                files.extend(os.path.join(root, name) for name in names)
+        elif os.path.isfile(pattern):
+            files.append(pattern)
+        else:
+            files.extend(glob.glob(pattern, recursive=True))
+
+    supported = IMAGE_EXTENSIONS | set(VIDEO_EXTENSIONS)
+    return sorted(
+        {
+            os.path.abspath(path)
+            for path in files
+            if os.path.splitext(path)[1].lower() in supported
+        }
+    )
+
+
+def processed_frames(output_path, output_format):
+    # (file, frame) of every record already written
+    if not os.path.exists(output_path):
+        return set()
+
+    done = set()
+    with open(output_path, newline="") as output:
+        if output_format == "csv":
+            for row in csv.DictReader(output):
+                done.add((row["file"], int(row["frame"])))
+        else:
+            for line in output:
+                try:
+                    record = json.loads(line)
+                    done.add((record["file"], record["frame"]))
+                except (ValueError, KeyError):
+                    # a run killed mid-write can leave a truncated last line
+                    continue
+    return done
+
+
+def finished_chunks(output_path):
+    # (file, start) of every finished chunk, including those that found no
+    # frame to write, from the .chunks file next to the output
+    done = set()
+    if not os.path.exists(output_path + ".chunks"):
+        return done
+    with open(output_path + ".chunks") as chunks:
+        for line in chunks:
+            try:
+                path, start = json.loads(line)
+            except ValueError:
+                continue
+            done.add((path, start))
+    return done
+
+
+def init_worker(settings):
+    global image_processing
+    cv2.setNumThreads(1)
+    image_processing = ImageProcessing()
+    image_processing.set_model(settings["model"])
+    image_processing.set_scale_factor(settings["scale_factor"])
+    image_processing.set_min_neighbors(settings["min_neighbors"])
+    image_processing.set_detection_max_width(settings["max_width"])
+    image_processing.set_equalization(settings["equalization"])
+
+
+def detect_frame(path, frame_index, frame):
+    start = time.perf_counter()
+    results = image_processing.find(frame, image_processing.model)
+    latency = (time.perf_counter() - start) * 1000
+    return {
+        "file": path,
+        "frame": frame_index,
+        "count": len(results),
+        "boxes": results,
+        "latency_ms": round(latency, 3),
+    }
+
+
+def video_chunks(path, chunk_frames):
+    # frame ranges of one video, processed in parallel like separate files;
+    # (start, None) runs to the end when the length is unknown
+    video = cv2.VideoCapture(path)
+    frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    video.release()
+    if frame_count <= 0:
+        return [(0, None)]
+    chunks = []
+    for start in range(0, frame_count, chunk_frames):
+        end = min(start + chunk_frames, frame_count)
+        # the last chunk also takes any frames the count missed
+        chunks.append((start, end if end < frame_count else None))
+    return chunks
+
+
+def first_frame(start, frame_step):
+    return -(-start // frame_step) * frame_step
+
+
+def process_chunk(task):
+    # returns (path, start, records, error); a chunk's records are written
+    # together, so resuming skips whole chunks
+    path, start, end, frame_step = task
+    if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+        frame = cv2.imread(path)
+        if frame is None:
+            return path, start, [], "could not read"
+        return path, start, [detect_frame(path, 0, frame)], None
+
+    records = []
+    video = cv2.VideoCapture(path)
+    if not video.isOpened():
+        return path, start, [], "could not open"
+    if start:
+        video.set(cv2.CAP_PROP_POS_FRAMES, start)
+    frame_index = start
+    while end is None or frame_index < end:
+        if frame_index % frame_step:
+            if not video.grab():
+                break
+        else:
+            ok, frame = video.read()
+            if not ok:
+                break
+            records.append(detect_frame(path, frame_index, frame))
+        frame_index += 1
+    video.release()
+    return path, start, records, None
+
+
+class ResultWriter:
+    def __init__(self, output_path, output_format):
+        self.output_format = output_format
+        new_file = not os.path.exists(output_path) or os.path.getsize(output_path) == 0
+        self.output = open(output_path, "a", newline="")
+        self.chunks = open(output_path + ".chunks", "a")
+        self.csv_writer = None
+        if output_format == "csv":
+            self.csv_writer = csv.DictWriter(self.output, fieldnames=FIELDS)
+            if new_file:
+                self.csv_writer.writeheader()
+
+    def write(self, path, start, records):
+        for record in records:
+            if self.csv_writer is not None:
+                self.csv_writer.writerow(
+                    {**record, "boxes": json.dumps(record["boxes"])}
+                )
+            else:
+                self.output.write(json.dumps(record) + "\n")
+        self.output.flush()
+        # only once its records are on disk does the chunk count as done
+        self.chunks.write(json.dumps([path, start]) + "\n")
+        self.chunks.flush()
+
+    def close(self):
+        self.output.close()
+        self.chunks.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless face/eye detection")
+    parser.add_argument(
+        "inputs", nargs="+", help="directories, globs, images or videos"
+    )
+    parser.add_argument("--output", default="detections.jsonl")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None)
+    parser.add_argument("--model", choices=MODELS, default="faces")
+    parser.add_argument("--scale-factor", type=float, default=1.5)
+    parser.add_argument("--min-neighbors", type=int, default=5)
+    parser.add_argument("--max-width", type=int, default=None)
+    parser.add_argument(
+        "--equalization", choices=["none", "hist", "clahe"], default="none"
+    )
+    parser.add_argument(
+        "--frame-step", type=int, default=1, help="process every Nth video frame"
+    )
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--chunk-frames",
+        type=int,
+        default=300,
+        help="videos are split into chunks of this many frames, processed in parallel",
+    )
+    args = parser.parse_args()
+
+    output_format = args.format or (
+        "csv" if args.output.lower().endswith(".csv") else "jsonl"
+    )
+    files = collect_inputs(args.inputs)
+    done = processed_frames(args.output, output_format)
+    done_chunks = finished_chunks(args.output)
+    frame_step = max(1, args.frame_step)
+    tasks = []
+    chunks = 0
+    for path in files:
+        if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS:
+            ranges = [(0, 1)]
+        else:
+            ranges = video_chunks(path, max(1, args.chunk_frames))
+        for start, end in ranges:
+            first = first_frame(start, frame_step)
+            if end is not None and first >= end:
+                continue
+            chunks += 1
+            # outputs written before the .chunks file only have the records
+            if (path, start) not in done_chunks and (path, first) not in done:
+                tasks.append((path, start, end, frame_step))
+    print(
+        f"{len(files)} inputs, {chunks - len(tasks)} of {chunks} chunks already processed"
+    )
+
+    settings = {
+        "model": args.model,
+        "scale_factor": args.scale_factor,
+        "min_neighbors": args.min_neighbors,
+        "max_width": args.max_width,
+        "equalization": args.equalization,
+    }
+    writer = ResultWriter(args.output, output_format)
+    start = time.perf_counter()
+    frames = 0
+    try:
+        with multiprocessing.get_context("spawn").Pool(
+            max(1, args.workers), initializer=init_worker, initargs=(settings,)
+        ) as pool:
+            # records are written as chunks finish, in whatever order
+            for path, chunk_start, records, error in pool.imap_unordered(
+                process_chunk, tasks
+            ):
+                if error is not None:
+                    print(f"Warning: {error} {path}, skipping.")
+                    continue
+                writer.write(path, chunk_start, records)
+                frames += len(records)
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"{frames} frames from {len(tasks)} chunks in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# Compares full-resolution detection against downscaled detection.
+# Run from the repository root so the cascade XML files are found:
+#   python -m benchmarks.detection_resolution --max-width 640 image1.jpg image2.png
+import argparse
+import time
+import cv2
+from image_processing import ImageProcessing
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    inter_w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    inter_h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = inter_w * inter_h
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def matched(reference, candidates, threshold=0.5):
+    return sum(
+        1 for box in reference if any(iou(box, c) >= threshold for c in candidates)
+    )
+
+
+def time_detection(find, image, repeat):
+    boxes = find(image)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        find(image)
+    return boxes, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--model", choices=["faces", "eyes"], default="faces")
+    parser.add_argument("--max-width", type=int, default=640)
+    parser.add_argument("--scale-factor", type=float, default=1.1)
+    parser.add_argument("--min-neighbors", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    image_processing = ImageProcessing()
+    image_processing.set_scale_factor(args.scale_factor)
+    image_processing.set_min_neighbors(args.min_neighbors)
+    find = (
+        image_processing.find_faces
+        if args.model == "faces"
+        else image_processing.find_eyes
+    )
+
+    total_full = total_small = 0.0
+    total_reference = total_matched = 0
+    for path in args.images:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Warning: could not read {path}, skipping.")
+            continue
+
+        image_processing.set_detection_max_width(None)
+        full_boxes, full_time = time_detection(find, image, args.repeat)
+        image_processing.set_detection_max_width(args.max_width)
+        small_boxes, small_time = time_detection(find, image, args.repeat)
+
+        hits = matched(full_boxes, small_boxes)
+        total_full += full_time
+        total_small += small_time
+        total_reference += len(full_boxes)
+        total_matched += hits
+        print(
+            f"{path}: {image.shape[1]}x{image.shape[0]} "
+            f"full {full_time * 1000:.1f} ms ({len(full_boxes)} boxes), "
+            f"downscaled {small_time * 1000:.1f} ms ({len(small_boxes)} boxes), "
+            f"recall {hits}/{len(full_boxes)}"
+        )
+
+    if total_small:
+        recall = total_matched / total_reference if total_reference else 1.0
+        print(
+            f"speedup {total_full / total_small:.2f}x, "
+            f"recall vs full resolution {recall:.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# Detection benchmark over a parameter grid with a regression gate.
+# Run from the repository root. The dataset is either a directory of images
+# or a synthetic, seeded set (reproducible, but without real faces):
+#   python -m benchmarks.detection_suite --images faces/ --save baseline.json
+#   python -m benchmarks.detection_suite --images faces/ --compare baseline.json
+# Compare mode exits with status 1 when any grid point loses more than
+# --threshold of its baseline throughput.
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import cv2
+import numpy as np
+from image_processing import ImageProcessing
+from profiling import LatencyHistogram
+
+
+def synthetic_images(count=8, size=(1280, 960), seed=0):
+    # smooth blobs over noise: deterministic and cascade-like enough to make
+    # the detector do real work at every scale
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        image = rng.integers(0, 255, (size[1] // 8, size[0] // 8, 3), dtype=np.uint8)
+        image = cv2.resize(image, size, interpolation=cv2.INTER_CUBIC)
+        for _ in range(6):
+            center = (int(rng.integers(0, size[0])), int(rng.integers(0, size[1])))
+            axes = (int(rng.integers(30, 150)), int(rng.integers(40, 180)))
+            color = tuple(int(v) for v in rng.integers(0, 255, 3))
+            cv2.ellipse(image, center, axes, 0, 0, 360, color, -1)
+        images.append(image)
+    return images
+
+
+def load_images(directory):
+    images = []
+    for name in sorted(os.listdir(directory)):
+        image = cv2.imread(os.path.join(directory, name))
+        if image is not None:
+            images.append(image)
+    return images
+
+
+def resize_to_width(image, width):
+    height = round(image.shape[0] * width / image.shape[1])
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def run_point(image_processing, images, model, repeat):
+    histogram = LatencyHistogram()
+    detections = 0
+    # warm-up: the first call also loads the cascade
+    image_processing.find(images[0], model)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for image in images:
+            call_start = time.perf_counter()
+            results = image_processing.find(image, model)
+            histogram.record((time.perf_counter() - call_start) * 1000)
+            detections += len(results)
+    elapsed = time.perf_counter() - start
+    summary = histogram.summary()
+    return {
+        "frames_per_second": round(histogram.count / elapsed, 3),
+        "latency_ms": {
+            key: summary[key] for key in ("mean_ms", "p50_ms", "p95_ms", "p99_ms")
+        },
+        "detections_per_frame": round(detections / histogram.count, 3),
+    }
+
+
+def point_key(model, width, scale_factor, min_neighbors):
+    return f"{model}/w{width}/sf{scale_factor}/mn{min_neighbors}"
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for key, point in results.items():
+        reference = baseline.get(key)
+        if reference is None:
+            continue
+        old = reference["frames_per_second"]
+        new = point["frames_per_second"]
+        change = (new - old) / old if old else 0.0
+        marker = "REGRESSION" if change < -threshold else "ok"
+        print(f"{key}: {old:.2f} -> {new:.2f} frames/s ({change:+.1%}) {marker}")
+        if change < -threshold:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", help="directory of images (default: synthetic)")
+    parser.add_argument("--models", nargs="+", default=["faces", "eyes"])
+    parser.add_argument("--widths", nargs="+", type=int, default=[320, 640, 1280])
+    parser.add_argument(
+        "--scale-factors", nargs="+", type=float, default=[1.05, 1.1, 1.3, 1.5, 2.0]
+    )
+    parser.add_argument("--min-neighbors", nargs="+", type=int, default=[3, 5, 8])
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=None, help="cv2.setNumThreads")
+    parser.add_argument("--save", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        cv2.setNumThreads(args.threads)
+    images = load_images(args.images) if args.images else synthetic_images()
+    if not images:
+        sys.exit(f"No images found in {args.images}")
+
+    image_processing = ImageProcessing()
+    results = {}
+    for width in args.widths:
+        scaled = [resize_to_width(image, width) for image in images]
+        grid = itertools.product(args.models, args.scale_factors, args.min_neighbors)
+        for model, scale_factor, min_neighbors in grid:
+            image_processing.set_scale_factor(scale_factor)
+            image_processing.set_min_neighbors(min_neighbors)
+            key = point_key(model, width, scale_factor, min_neighbors)
+            results[key] = run_point(image_processing, scaled, model, args.repeat)
+            point = results[key]
+            print(
+                f"{key}: {point['frames_per_second']:.2f} frames/s, "
+                f"p50 {point['latency_ms']['p50_ms']:.1f} ms, "
+                f"p95 {point['latency_ms']['p95_ms']:.1f} ms, "
+                f"{point['detections_per_frame']:.2f} detections/frame"
+            )
+
+    if args.save:
+        report = {
+            "environment": {
+                "opencv": cv2.__version__,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "threads": cv2.getNumThreads(),
+                "dataset": args.images or "synthetic",
+                "images": len(images),
+            },
+            "results": results,
+        }
+        with open(args.save, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        dataset = args.images or "synthetic"
+        if baseline["environment"]["dataset"] != dataset:
+            print(
+                f"Warning: baseline used dataset {baseline['environment']['dataset']}, "
+                f"this run used {dataset}."
+            )
+        regressions = compare(results, baseline["results"], args.threshold)
+        if regressions:
+            print(
+                f"{len(regressions)} throughput regressions beyond {args.threshold:.0%}"
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# Compares the capture -> detect -> display loop with and without the frame
+# pool: throughput, frame arrays allocated, page faults (a proxy for
+# allocator churn on large buffers) and peak memory. Each mode runs in its
+# own process so peak RSS is per mode. Run from the repository root:
+#   python -m benchmarks.frame_pool --seconds 10
+#   python -m benchmarks.frame_pool --video clip.mp4 --color gray
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+from capture import CaptureThread, FramePool, FrameRingBuffer
+from image_processing import ImageProcessing
+from qt_adapter import DisplayPipeline
+
+
+class SyntheticCapture:
+    # VideoCapture stand-in: "decodes" by copying one of a few prepared
+    # frames, into the given array when there is one, like read(image)
+    def __init__(self, width, height, fps):
+        rng = np.random.default_rng(0)
+        self.frames = [
+            rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(4)
+        ]
+        self.interval = 1 / fps if fps else 0
+        self.next_time = 0.0
+        self.index = 0
+
+    def read(self, image=None):
+        delay = self.next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_time = max(self.next_time + self.interval, time.perf_counter())
+        source = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        if image is None or image.shape != source.shape:
+            image = np.empty_like(source)
+        np.copyto(image, source)
+        return True, image
+
+    def release(self):
+        pass
+
+
+def run_mode(args):
+    if args.video:
+        import cv2
+
+        capture = cv2.VideoCapture(args.video)
+    else:
+        capture = SyntheticCapture(args.width, args.height, args.fps)
+    pooled = args.mode == "pooled"
+    frame_pool = FramePool() if pooled else None
+    frame_buffer = FrameRingBuffer(
+        capacity=2, on_drop=frame_pool.release if pooled else None
+    )
+    image_processing = ImageProcessing()
+    image_processing.set_image_color(args.color)
+    image_processing.set_detection_max_width(args.detection_width)
+    display_pipeline = DisplayPipeline(
+        args.display_width, args.display_height, max_fps=0
+    )
+
+    capture_thread = CaptureThread(capture, frame_buffer, frame_pool=frame_pool)
+    tracemalloc.start()
+    start_faults = resource.getrusage(resource.RUSAGE_SELF).ru_minflt
+    capture_thread.start()
+    frames = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < args.seconds:
+        _, frame = frame_buffer.get_latest(timeout=0.5)
+        if frame is None:
+            continue
+        count, cv_image = image_processing.process_image(frame, reuse_output=pooled)
+        display_pipeline.post(count, cv_image)
+        display_pipeline.take()
+        if pooled:
+            frame_pool.release(frame)
+        frames += 1
+    elapsed = time.perf_counter() - start
+    capture_thread.stop()
+    _, peak = tracemalloc.get_traced_memory()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+
+    report = {
+        "mode": args.mode,
+        "frames_per_second": round(frames / elapsed, 2),
+        "captured_per_second": round(frame_buffer.stats()["captured"] / elapsed, 2),
+        "page_faults_per_frame": round(
+            (usage.ru_minflt - start_faults) / max(1, frames), 1
+        ),
+        "traced_peak_mb": round(peak / 2**20, 1),
+        "max_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "capture": frame_buffer.stats(),
+    }
+    if pooled:
+        report["pool"] = frame_pool.stats()
+    print(json.dumps(report))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=["baseline", "pooled"])
+    parser.add_argument("--video", help="video file instead of synthetic frames")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument(
+        "--fps", type=float, default=30, help="synthetic capture rate, 0 = unpaced"
+    )
+    parser.add_argument("--color", choices=["rgb", "gray"], default="rgb")
+    parser.add_argument("--detection-width", type=int, default=320)
+    parser.add_argument("--display-width", type=int, default=1000)
+    parser.add_argument("--display-height", type=int, default=800)
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    reports = []
+    for mode in ("baseline", "pooled"):
+        command = [sys.executable, "-m", "benchmarks.frame_pool", "--mode", mode]
+        command += sys.argv[1:]
+        output = subprocess.run(command, capture_output=True, text=True, check=True)
+        reports.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    for report in reports:
+        print(json.dumps(report, indent=2))
+    baseline, pooled = reports
+    print(
+        f"throughput {baseline['frames_per_second']} -> "
+        f"{pooled['frames_per_second']} frames/s, "
+        f"page faults/frame {baseline['page_faults_per_frame']} -> "
+        f"{pooled['page_faults_per_frame']}, "
+        f"max RSS {baseline['max_rss_mb']} -> {pooled['max_rss_mb']} MB"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# Measures GUI-thread CPU and pending frame events while the real main
+# window displays a static image or a camera. A video file path can stand in
+# for the camera. Run from the repository root:
+#   python -m benchmarks.gui_load --image photo.jpg --seconds 10
+#   python -m benchmarks.gui_load --camera 0 --seconds 10
+import argparse
+import json
+import os
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--image")
+    source.add_argument("--camera", help="device index or video file")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--max-display-fps", type=float, default=30)
+    parser.add_argument("--offscreen", action="store_true")
+    args = parser.parse_args()
+
+    if args.offscreen:
+        os.environ["QT_QPA_PLATFORM"] = "offscreen"
+
+    from PySide6.QtWidgets import QApplication
+    from PySide6.QtCore import QTimer
+    from front_end.main_window import MainWindow
+
+    app = QApplication([])
+    main_window = MainWindow()
+    main_window.show()
+    update_image_thread = main_window.main_widget.update_image_thread
+    update_image_thread.display_pipeline.set_max_fps(args.max_display_fps)
+    if args.image:
+        update_image_thread.open_file(args.image)
+    else:
+        # a video path goes through the camera path too, unpaced
+        camera = int(args.camera) if args.camera.isdigit() else args.camera
+        update_image_thread.open_camera(camera)
+
+    start_wall = time.perf_counter()
+    start_cpu = time.thread_time()
+
+    def finish():
+        # both readings come from the GUI thread, so this is its CPU only
+        gui_cpu = time.thread_time() - start_cpu
+        wall = time.perf_counter() - start_wall
+        update_image_thread.stop()
+        report = {
+            "seconds": round(wall, 2),
+            "gui_thread_cpu_percent": round(100 * gui_cpu / wall, 2),
+            "display": update_image_thread.display_pipeline.stats(),
+            "capture": update_image_thread.frame_stats(),
+        }
+        print(json.dumps(report, indent=2))
+        app.quit()
+
+    QTimer.singleShot(int(args.seconds * 1000), finish)
+    app.exec()
+
+
+if __name__ == "__main__":
+    main()
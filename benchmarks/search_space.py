@@ -0,0 +1,81 @@
+# Measures how much min/max object size and a region of interest speed up
+# detection, and how many of the unrestricted detections they keep. Sizes
+# are object widths in frame pixels, the ROI is x,y,w,h in frame fractions.
+# Run from the repository root:
+#   python -m benchmarks.search_space photo.jpg --min-size 80 --roi 0.25,0,0.5,0.6
+import argparse
+import time
+import cv2
+from image_processing import ImageProcessing
+from benchmarks.detection_resolution import matched
+
+
+def time_find(image_processing, image, model, repeat):
+    boxes = image_processing.find(image, model)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        image_processing.find(image, model)
+    return boxes, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--model", choices=["faces", "eyes"], default="faces")
+    parser.add_argument("--scale-factor", type=float, default=1.1)
+    parser.add_argument("--min-neighbors", type=int, default=5)
+    parser.add_argument("--min-size", type=int, default=0)
+    parser.add_argument("--max-size", type=int, default=0)
+    parser.add_argument("--roi", help="x,y,w,h as fractions of the frame")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    roi = tuple(float(v) for v in args.roi.split(",")) if args.roi else None
+    min_size = (args.min_size, args.min_size) if args.min_size else None
+    max_size = (args.max_size, args.max_size) if args.max_size else None
+    variants = [("unrestricted", None, None, None)]
+    if min_size or max_size:
+        variants.append(("sizes", min_size, max_size, None))
+    if roi:
+        variants.append(("roi", None, None, roi))
+    if roi and (min_size or max_size):
+        variants.append(("sizes+roi", min_size, max_size, roi))
+
+    image_processing = ImageProcessing()
+    image_processing.set_scale_factor(args.scale_factor)
+    image_processing.set_min_neighbors(args.min_neighbors)
+    totals = {name: [0.0, 0, 0] for name, *_ in variants}
+    for path in args.images:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Warning: could not read {path}, skipping.")
+            continue
+
+        image_processing.set_source(path)
+        reference = None
+        for name, min_size, max_size, region in variants:
+            image_processing.set_min_size(min_size)
+            image_processing.set_max_size(max_size)
+            image_processing.set_roi(region)
+            boxes, elapsed = time_find(image_processing, image, args.model, args.repeat)
+            if reference is None:
+                reference = boxes
+            hits = matched(reference, boxes)
+            totals[name][0] += elapsed
+            totals[name][1] += hits
+            totals[name][2] += len(reference)
+            print(
+                f"{path} {name}: {elapsed * 1000:.1f} ms, {len(boxes)} boxes, "
+                f"kept {hits}/{len(reference)}"
+            )
+
+    baseline = totals["unrestricted"][0]
+    if not baseline:
+        return
+    for name, (elapsed, hits, reference) in totals.items():
+        kept = hits / reference if reference else 1.0
+        print(f"{name}: speedup {baseline / elapsed:.2f}x, kept {kept:.1%}")
+
+
+if __name__ == "__main__":
+    main()
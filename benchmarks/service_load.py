@@ -0,0 +1,132 @@
+# Drives the detection service with concurrent local clients and reports
+# throughput, client-side latency and how requests were batched. Starts a
+# service per batch window unless --address points at a running one. Run
+# from the repository root:
+#   python -m benchmarks.service_load photo.jpg --clients 8 --seconds 10
+#   python -m benchmarks.service_load photo.jpg --batch-window-ms 0 2 5 --raw
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import cv2
+from profiling import LatencyHistogram
+from service import DetectionClient
+
+
+def wait_until_healthy(address, process, timeout=30):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("The service exited during startup")
+        try:
+            client = DetectionClient(address, timeout=1)
+            client.health()
+            client.close()
+            return
+        except (OSError, RuntimeError):
+            time.sleep(0.1)
+    raise RuntimeError(f"The service at {address} did not become healthy")
+
+
+def drive(address, payload, options, clients, seconds):
+    histogram = LatencyHistogram()
+    lock = threading.Lock()
+    counts = {"ok": 0, "failed": 0}
+    stop = threading.Event()
+
+    def client_loop():
+        client = DetectionClient(address)
+        while not stop.is_set():
+            start = time.perf_counter()
+            try:
+                client.detect(payload, **options)
+            except (OSError, RuntimeError):
+                with lock:
+                    counts["failed"] += 1
+                client.close()
+                client = DetectionClient(address)
+                continue
+            with lock:
+                counts["ok"] += 1
+                histogram.record((time.perf_counter() - start) * 1000)
+        client.close()
+
+    threads = [threading.Thread(target=client_loop) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        "requests_per_s": round(counts["ok"] / elapsed, 1),
+        "failed": counts["failed"],
+        "latency": histogram.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image")
+    parser.add_argument("--address", help="host:port or socket of a running service")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--batch-window-ms", type=float, nargs="+", default=[2.0])
+    parser.add_argument(
+        "--tcp", action="store_true", help="TCP instead of a Unix socket"
+    )
+    parser.add_argument("--raw", action="store_true", help="send raw frames, not JPEG")
+    parser.add_argument("--max-width", type=int, default=0)
+    args = parser.parse_args()
+
+    image = cv2.imread(args.image)
+    if image is None:
+        sys.exit(f"Could not read {args.image}")
+    payload = image if args.raw else cv2.imencode(".jpg", image)[1].tobytes()
+    options = {"max_width": args.max_width} if args.max_width else {}
+
+    runs = [(args.address, None)] if args.address else []
+    for window in [] if args.address else args.batch_window_ms:
+        if args.tcp:
+            address, listen = "127.0.0.1:8765", ["--port", "8765"]
+        else:
+            address = os.path.join(tempfile.gettempdir(), "face_eyes_service.sock")
+            listen = ["--unix", address]
+        command = [
+            sys.executable,
+            "service.py",
+            *listen,
+            "--batch-window-ms",
+            str(window),
+        ]
+        if args.workers:
+            command += ["--workers", str(args.workers)]
+        runs.append((address, (window, command)))
+
+    for address, spawn in runs:
+        process = None
+        if spawn is not None:
+            process = subprocess.Popen(spawn[1], stdout=subprocess.DEVNULL)
+        try:
+            wait_until_healthy(address, process)
+            report = drive(address, payload, options, args.clients, args.seconds)
+            metrics = DetectionClient(address).metrics()
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+        report["batch_window_ms"] = spawn[0] if spawn else None
+        report["batching"] = metrics["batching"]
+        report["server_latency"] = metrics["latency"]
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
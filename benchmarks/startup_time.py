@@ -0,0 +1,55 @@
+# Measures import and first-detection time of the headless core versus the
+# Qt back end, each in a fresh interpreter. Run from the repository root:
+#   python -m benchmarks.startup_time [--repeat 5] [image.jpg]
+import argparse
+import statistics
+import subprocess
+import sys
+
+
+SNIPPETS = {
+    "import detection core": "import image_processing",
+    "import Qt back end": "import back_end",
+    "core: import + first detection": (
+        "import cv2, image_processing\n"
+        "image_processing.ImageProcessing().find_faces(cv2.imread({image!r}))"
+    ),
+}
+
+
+def time_snippet(code, repeat):
+    timings = []
+    for _ in range(repeat):
+        script = (
+            "import time\n"
+            "start = time.perf_counter()\n"
+            f"{code}\n"
+            "print(time.perf_counter() - start)\n"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image", nargs="?", default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, code in SNIPPETS.items():
+        if "{image" in code:
+            if args.image is None:
+                continue
+            code = code.format(image=args.image)
+        timings = time_snippet(code, args.repeat)
+        print(
+            f"{name}: median {statistics.median(timings) * 1000:.1f} ms, "
+            f"min {min(timings) * 1000:.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Compares one-piece detection on large stills with tiled detection, with
+# and without the reduced-resolution candidate pass, and how many of the
+# one-piece detections each keeps. The candidate variant includes its
+# IMREAD_REDUCED_* decode. Run from the repository root:
+#   python -m benchmarks.tiled_detection group_photo.jpg --reduce 4 --workers 8
+import argparse
+import time
+import cv2
+from image_processing import ImageProcessing
+from tiling import TiledDetector
+from benchmarks.detection_resolution import matched
+
+
+def time_process(image_processing, path, image, tiling, repeat):
+    image_processing.set_tiling(tiling)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        reduced = tiling.read_reduced(path) if tiling is not None else None
+        image_processing.process_image(image.copy(), reduced=reduced)
+    return image_processing.last_results, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("images", nargs="+")
+    parser.add_argument("--scale-factor", type=float, default=1.1)
+    parser.add_argument("--min-neighbors", type=int, default=5)
+    parser.add_argument("--tile-size", type=int, default=2048)
+    parser.add_argument("--reduce", type=int, choices=[2, 4, 8], default=4)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    variants = [
+        ("one piece", None),
+        ("tiled", TiledDetector(0, args.tile_size, workers=args.workers)),
+        (
+            f"tiled, 1/{args.reduce} candidates",
+            TiledDetector(0, args.tile_size, reduce=args.reduce, workers=args.workers),
+        ),
+    ]
+    image_processing = ImageProcessing()
+    image_processing.set_scale_factor(args.scale_factor)
+    image_processing.set_min_neighbors(args.min_neighbors)
+    for path in args.images:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"Warning: could not read {path}, skipping.")
+            continue
+        megapixels = image.shape[0] * image.shape[1] / 1e6
+        reference = None
+        for name, tiling in variants:
+            boxes, elapsed = time_process(
+                image_processing, path, image, tiling, args.repeat
+            )
+            if reference is None:
+                reference, baseline = boxes, elapsed
+            hits = matched(reference, boxes)
+            print(
+                f"{path} ({megapixels:.1f} MP) {name}: {elapsed * 1000:.0f} ms "
+                f"({baseline / elapsed:.2f}x), {len(boxes)} boxes, "
+                f"kept {hits}/{len(reference)}"
+            )
+
+    for _, tiling in variants:
+        if tiling is not None:
+            tiling.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+import cv2
+
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm", ".m4v", ".wmv")
+
+
+class FramePool:
+    # Reusable frame arrays for the capture -> detect -> display path.
+    # Readers decode straight into a pooled array and the pipeline hands it
+    # back once the frame has been shown or dropped. When the pool is empty
+    # the reader lets OpenCV allocate, and that array joins the pool when it
+    # comes back, so the pool settles at the number of frames in flight
+    # (capped at max_size) and a slow consumer never stalls capture.
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.free = []
+        self.shape = None
+        self.allocated = 0
+        self.reused = 0
+
+    def read(self, capture):
+        with self.lock:
+            buffer = self.free.pop() if self.free else None
+        if buffer is None:
+            ok, frame = capture.read()
+        else:
+            ok, frame = capture.read(buffer)
+        with self.lock:
+            if frame is not None and frame is buffer:
+                self.reused += 1
+            else:
+                self.allocated += 1
+        if buffer is not None and frame is not buffer:
+            self.release(buffer)
+        return ok, frame
+
+    def release(self, frame):
+        if frame is None:
+            return
+        with self.lock:
+            if frame.shape != self.shape:
+                # new resolution: buffers of the old one are no use any more
+                self.shape = frame.shape
+                self.free = []
+            if len(self.free) < self.max_size:
+                self.free.append(frame)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "allocated": self.allocated,
+                "reused": self.reused,
+                "free": len(self.free),
+            }
+
+
+class FrameRingBuffer:
+    # Keeps only the newest frames. Writers never block: when the buffer is
+    # full the oldest frame is overwritten. Readers always take the freshest
+    # frame and skip whatever older frames are still queued. Frames that are
+    # never handed out go to on_drop, e.g. back to a FramePool.
+    def __init__(self, capacity=2, on_drop=None):
+        self.frames = deque(maxlen=capacity)
+        self.on_drop = on_drop
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.captured = 0
+        self.overwritten = 0
+        self.skipped = 0
+        self.consumed = 0
+
+    def put(self, frame):
+        dropped = None
+        with self.condition:
+            if len(self.frames) == self.frames.maxlen:
+                self.overwritten += 1
+                _, dropped = self.frames[0]
+            self.sequence += 1
+            self.captured += 1
+            self.frames.append((self.sequence, frame))
+            self.condition.notify()
+        self.drop([dropped])
+
+    def drop(self, frames):
+        if self.on_drop is not None:
+            for frame in frames:
+                if frame is not None:
+                    self.on_drop(frame)
+
+    def get_latest(self, timeout=None):
+        with self.condition:
+            if not self.frames and not self.condition.wait_for(
+                lambda: self.frames, timeout
+            ):
+                return None, None
+            sequence, frame = self.frames.pop()
+            skipped = [older for _, older in self.frames]
+            self.skipped += len(skipped)
+            self.frames.clear()
+            self.consumed += 1
+        self.drop(skipped)
+        return sequence, frame
+
+    def clear(self):
+        with self.condition:
+            cleared = [frame for _, frame in self.frames]
+            self.frames.clear()
+        self.drop(cleared)
+
+    def stats(self):
+        with self.condition:
+            return {
+                "captured": self.captured,
+                "dropped_capture": self.overwritten,
+                "dropped_detection": self.skipped,
+                "processed": self.consumed,
+            }
+
+
+class CaptureThread(threading.Thread):
+    def __init__(self, capture, frame_buffer, retry_interval=0.05, frame_pool=None):
+        super().__init__(daemon=True)
+        self.capture = capture
+        self.frame_buffer = frame_buffer
+        self.frame_pool = frame_pool
+        self.retry_interval = retry_interval
+        self.stop_event = threading.Event()
+        self.read_failures = 0
+
+    def run(self):
+        while not self.stop_event.is_set():
+            if self.frame_pool is not None:
+                ok, frame = self.frame_pool.read(self.capture)
+            else:
+                ok, frame = self.capture.read()
+            if not ok or frame is None:
+                self.read_failures += 1
+                time.sleep(self.retry_interval)
+                continue
+            self.frame_buffer.put(frame)
+
+    def stop(self):
+        # False when a read is still stuck after the timeout: the capture
+        # then still belongs to this thread
+        self.stop_event.set()
+        self.join(timeout=2)
+        return not self.is_alive()
+
+
+class CameraPool:
+    # Opens cameras on first use. A released camera stays open ("warm") for
+    # idle_timeout seconds so switching back to it is instant; at most
+    # max_warm idle cameras are kept and close_all() releases everything.
+    # Only used from the pipeline thread.
+    def __init__(self, max_warm=1, idle_timeout=30.0):
+        self.max_warm = max_warm
+        self.idle_timeout = idle_timeout
+        self.in_use = {}
+        self.warm = OrderedDict()
+
+    def acquire(self, index):
+        if index in self.in_use:
+            return self.in_use[index]
+        if index in self.warm:
+            camera, _ = self.warm.pop(index)
+        else:
+            camera = cv2.VideoCapture(index)
+        if not camera.isOpened():
+            camera.release()
+            return None
+        self.in_use[index] = camera
+        return camera
+
+    def release(self, index, keep_warm=True):
+        # keep_warm=False closes the camera now, e.g. when its capture thread
+        # could not be stopped and may still be reading from it
+        camera = self.in_use.pop(index, None)
+        if camera is None:
+            return
+        if not keep_warm:
+            camera.release()
+            return
+        self.warm[index] = (camera, time.monotonic())
+        while len(self.warm) > self.max_warm:
+            _, (oldest, _) = self.warm.popitem(last=False)
+            oldest.release()
+
+    def expire(self):
+        now = time.monotonic()
+        for index, (camera, released_at) in list(self.warm.items()):
+            if now - released_at >= self.idle_timeout:
+                del self.warm[index]
+                camera.release()
+
+    def close_all(self):
+        for camera in self.in_use.values():
+            camera.release()
+        for camera, _ in self.warm.values():
+            camera.release()
+        self.in_use.clear()
+        self.warm.clear()
+
+
+class VideoFileReader(threading.Thread):
+    # Decodes a video file on its own thread into a bounded read-ahead queue.
+    # In fast mode every frame is handed out in order as soon as it is
+    # decoded; in real-time mode next_frame() follows the wall clock and
+    # drops frames that are already late. Frames come with their index and
+    # timestamp in the file, and seek() can be called from any thread.
+    def __init__(self, path, read_ahead=8, realtime=False, frame_pool=None):
+        super().__init__(daemon=True)
+        self.path = path
+        self.frame_pool = frame_pool
+        self.realtime = realtime
+        self.frames = queue.Queue(maxsize=read_ahead)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.pending_seek = None
+        self.generation = 0
+        self.finished = False
+        self.capture = cv2.VideoCapture(path)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30
+        self.clock_generation = None
+        self.clock_start = 0.0
+        self.decoded = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def is_opened(self):
+        return self.capture.isOpened()
+
+    def set_realtime(self, realtime):
+        self.realtime = realtime
+        self.clock_generation = None
+
+    def seek(self, timestamp_ms):
+        # frames decoded before the seek carry an older generation and are
+        # skipped by next_frame() from now on
+        with self.lock:
+            self.pending_seek = max(0.0, timestamp_ms)
+            self.generation += 1
+
+    def run(self):
+        index = 0
+        generation = self.generation
+        while not self.stop_event.is_set():
+            with self.lock:
+                seek = self.pending_seek
+                self.pending_seek = None
+                generation = self.generation
+            if seek is not None:
+                self.capture.set(cv2.CAP_PROP_POS_MSEC, seek)
+                index = int(self.capture.get(cv2.CAP_PROP_POS_FRAMES))
+                self.finished = False
+                self.drain()
+
+            if self.finished:
+                time.sleep(0.05)
+                continue
+            if self.frame_pool is not None:
+                ok, frame = self.frame_pool.read(self.capture)
+            else:
+                ok, frame = self.capture.read()
+            if not ok:
+                # end of file: None tells the reader, a later seek can resume
+                self.finished = True
+                self.put((generation, None))
+                continue
+            timestamp_ms = self.capture.get(cv2.CAP_PROP_POS_MSEC)
+            if not timestamp_ms and index:
+                timestamp_ms = index * 1000 / self.fps
+            self.decoded += 1
+            self.put((generation, (index, timestamp_ms, frame)))
+            index += 1
+
+        self.capture.release()
+
+    def put(self, item):
+        # blocks while the read-ahead is full, but keeps an eye on stop/seek
+        while not self.stop_event.is_set():
+            try:
+                self.frames.put(item, timeout=0.05)
+                return
+            except queue.Full:
+                if self.pending_seek is not None:
+                    break
+        self.release(item)
+
+    def release(self, item):
+        _, frame_item = item
+        if self.frame_pool is not None and frame_item is not None:
+            self.frame_pool.release(frame_item[2])
+
+    def drain(self):
+        while True:
+            try:
+                self.release(self.frames.get_nowait())
+            except queue.Empty:
+                return
+
+    def next_frame(self, timeout=None):
+        # (index, timestamp_ms, frame), or None on timeout or at the end
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.perf_counter()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                generation, item = self.frames.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if generation != self.generation:
+                self.release((generation, item))
+                continue
+            if item is None:
+                return None
+            if not self.realtime:
+                self.delivered += 1
+                return item
+
+            now = time.perf_counter()
+            if self.clock_generation != generation:
+                # the clock starts at the first frame after a seek or mode change
+                self.clock_generation = generation
+                self.clock_start = now - item[1] / 1000
+            due = self.clock_start + item[1] / 1000
+            if now > due + 1 / self.fps and not self.frames.empty():
+                self.dropped += 1
+                self.release((generation, item))
+                continue
+            if due > now:
+                time.sleep(due - now)
+            self.delivered += 1
+            return item
+
+    def stop(self):
+        self.stop_event.set()
+        self.join(timeout=2)
+        self.drain()
+
+    def stats(self):
+        return {
+            "decoded": self.decoded,
+            "delivered": self.delivered,
+            "dropped_late": self.dropped,
+            "read_ahead": self.frames.qsize(),
+        }
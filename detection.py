@@ -0,0 +1,139 @@
+# Pure NumPy/OpenCV detection core: no Qt, no serial. Everything here works
+# on plain arrays and returns boxes as lists of (x, y, w, h) int tuples.
+import os
+import threading
+import cv2
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FACE_CASCADE_PATH = os.path.join(BASE_DIR, "haarcascade_frontalface_default.xml")
+EYE_CASCADE_PATH = os.path.join(BASE_DIR, "haarcascade_eye.xml")
+MODELS = ("faces", "eyes", "faces+eyes")
+
+# CascadeClassifier is not safe to share between threads, so every thread
+# keeps its own copy, loaded the first time it is needed.
+_cascades = threading.local()
+
+
+def load_cascade(path):
+    loaded = getattr(_cascades, "loaded", None)
+    if loaded is None:
+        loaded = _cascades.loaded = {}
+    cascade = loaded.get(path)
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(path)
+        if cascade.empty():
+            raise FileNotFoundError(f"Could not load cascade {path}")
+        loaded[path] = cascade
+    return cascade
+
+
+def to_boxes(boxes):
+    return [tuple(int(v) for v in box) for box in boxes]
+
+
+def scale_boxes(boxes, ratio, offset=(0, 0)):
+    # offset is where the searched region starts, in the scaled image
+    if offset != (0, 0):
+        boxes = [(x + offset[0], y + offset[1], w, h) for x, y, w, h in boxes]
+    if ratio == 1.0:
+        return to_boxes(boxes)
+    return [tuple(int(round(v / ratio)) for v in box) for box in boxes]
+
+
+def scale_results(results, ratio, model, offset=(0, 0)):
+    if model == "faces+eyes":
+        return [
+            (scale_boxes([face], ratio, offset)[0], scale_boxes(eyes, ratio, offset))
+            for face, eyes in results
+        ]
+    return scale_boxes(results, ratio, offset)
+
+
+def roi_box(roi, width, height):
+    # roi is (x, y, w, h) in fractions of the frame, so it survives a change
+    # of resolution; returns the matching pixel box, at least 1x1
+    left = min(width - 1, max(0, int(roi[0] * width)))
+    top = min(height - 1, max(0, int(roi[1] * height)))
+    right = max(left + 1, min(width, int(round((roi[0] + roi[2]) * width))))
+    bottom = max(top + 1, min(height, int(round((roi[1] + roi[3]) * height))))
+    return left, top, right - left, bottom - top
+
+
+def box_overlap(a, b):
+    # intersection over the smaller box, so a face cut at a tile edge, whose
+    # box sits inside the whole one, counts as a duplicate too
+    w = min(a[0] + a[2], b[0] + b[2]) - max(a[0], b[0])
+    h = min(a[1] + a[3], b[1] + b[3]) - max(a[1], b[1])
+    if w <= 0 or h <= 0:
+        return 0.0
+    return w * h / min(a[2] * a[3], b[2] * b[3])
+
+
+def suppress_duplicates(results, model, threshold=0.5):
+    # greedy non-maximum suppression; Haar boxes have no score, so the
+    # larger box wins
+    def face(result):
+        return result[0] if model == "faces+eyes" else result
+
+    kept = []
+    for result in sorted(results, key=lambda r: face(r)[2] * face(r)[3], reverse=True):
+        if all(box_overlap(face(result), face(other)) < threshold for other in kept):
+            kept.append(result)
+    return kept
+
+
+def detect_boxes(
+    face_cascade,
+    eye_cascade,
+    image,
+    model,
+    scale_factor,
+    min_neighbors,
+    min_size=None,
+    max_size=None,
+):
+    # min_size/max_size are (w, h) in image pixels and bound the objects
+    # searched for; in faces+eyes mode they apply to the faces
+    sizes = {}
+    if min_size:
+        sizes["minSize"] = tuple(min_size)
+    if max_size:
+        sizes["maxSize"] = tuple(max_size)
+
+    if model == "faces":
+        return to_boxes(
+            face_cascade.detectMultiScale(image, scale_factor, min_neighbors, **sizes)
+        )
+    elif model == "eyes":
+        return to_boxes(
+            eye_cascade.detectMultiScale(image, scale_factor, min_neighbors, **sizes)
+        )
+    elif model == "faces+eyes":
+        faces = face_cascade.detectMultiScale(
+            image, scale_factor, min_neighbors, **sizes
+        )
+        results = []
+        for x, y, w, h in to_boxes(faces):
+            # eyes only ever sit in the upper half of a face
+            face_top = image[y : y + h // 2, x : x + w]
+            eyes = eye_cascade.detectMultiScale(face_top, scale_factor, min_neighbors)
+            eyes = [(x + ex, y + ey, ew, eh) for ex, ey, ew, eh in to_boxes(eyes)]
+            results.append(((x, y, w, h), eyes))
+        return results
+    return []
+
+
+def draw_boxes(cv_image, boxes, color=(255, 0, 0)):
+    for x, y, w, h in boxes:
+        cv2.rectangle(cv_image, (x, y), (x + w, y + h), color, 2)
+
+
+def draw_results(cv_image, model, results):
+    if model == "faces+eyes":
+        for face, eyes in results:
+            draw_boxes(cv_image, [face])
+            draw_boxes(cv_image, eyes, (0, 255, 0))
+    else:
+        draw_boxes(cv_image, results)
+    return cv_image
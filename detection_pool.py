@@ -0,0 +1,229 @@
+import os
+import queue
+import threading
+import time
+import multiprocessing
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+import cv2
+import numpy as np
+from detection import FACE_CASCADE_PATH, EYE_CASCADE_PATH, detect_boxes, load_cascade
+
+
+def detection_worker(face_path, eye_path, tasks, results):
+    # one core per worker, the pool itself provides the parallelism
+    cv2.setNumThreads(1)
+    face_cascade = load_cascade(face_path)
+    eye_cascade = load_cascade(eye_path)
+    attached = {}
+    while True:
+        batch = tasks.get()
+        if batch is None:
+            break
+        # a batch of frames comes in one message and goes back in one
+        finished = []
+        for sequence, slot, name, shape, params in batch:
+            memory = attached.get(slot)
+            if memory is None or memory.name != name:
+                if memory is not None:
+                    memory.close()
+                memory = shared_memory.SharedMemory(name=name)
+                attached[slot] = memory
+            image = np.ndarray(shape, np.uint8, buffer=memory.buf)
+            start = time.perf_counter()
+            try:
+                boxes = detect_boxes(face_cascade, eye_cascade, image, *params)
+            except cv2.error as error:
+                # goes back to the caller's future; the worker carries on
+                boxes = error
+            except Exception as error:
+                boxes = RuntimeError(f"Detection failed: {error}")
+            del image
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            finished.append((sequence, slot, boxes, elapsed_ms))
+        results.put(finished)
+
+    for memory in attached.values():
+        memory.close()
+
+
+class ProcessPoolDetectionExecutor:
+    # Runs the cascades in worker processes. Frames are copied into shared
+    # memory slots and every submit() returns a Future, so several callers
+    # (one per video source, for example) can share one pool. Each caller
+    # keeps its own futures in submission order to emit results in order.
+    # Each worker has its own task queue, so when one dies (a crash in
+    # OpenCV, the OOM killer) its frames fail and it is started again.
+    def __init__(
+        self,
+        workers=None,
+        slots=None,
+        face_path=FACE_CASCADE_PATH,
+        eye_path=EYE_CASCADE_PATH,
+        max_restarts=10,
+    ):
+        workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        slots = slots or 2 * workers
+        # spawn: forking a process that already runs Qt threads is unsafe
+        self.context = multiprocessing.get_context("spawn")
+        self.cascade_paths = (face_path, eye_path)
+        self.results = self.context.Queue()
+        self.task_queues = [None] * workers
+        self.processes = [None] * workers
+        for index in range(workers):
+            self.start_worker(index)
+        self.restarts_left = max_restarts
+
+        self.memories = [None] * slots
+        self.free_slots = list(range(slots))
+        self.condition = threading.Condition()
+        # sequence -> (future, slot, worker index)
+        self.futures = {}
+        self.sequence = 0
+        self.closed = False
+        self.result_thread = threading.Thread(target=self.collect, daemon=True)
+        self.result_thread.start()
+
+    def start_worker(self, index):
+        # replaced in place: callers may hold on to the processes list
+        tasks = self.context.Queue()
+        process = self.context.Process(
+            target=detection_worker,
+            args=(*self.cascade_paths, tasks, self.results),
+            daemon=True,
+        )
+        process.start()
+        self.task_queues[index] = tasks
+        self.processes[index] = process
+
+    def submit(self, image, params):
+        return self.submit_batch([(image, params)])[0]
+
+    def submit_batch(self, items):
+        # (image, params) pairs; they are spread over the workers in at most
+        # one message per worker instead of one per frame
+        chunk = -(-len(items) // len(self.processes))
+        chunk = max(1, min(chunk, len(self.memories)))
+        futures = []
+        for start in range(0, len(items), chunk):
+            futures += self.send(items[start : start + chunk])
+        return futures
+
+    def send(self, items):
+        with self.condition:
+            # blocks while the slots are in flight: natural backpressure
+            self.condition.wait_for(
+                lambda: len(self.free_slots) >= len(items) or self.closed
+            )
+            if self.closed:
+                raise RuntimeError("Detection executor is closed")
+            # the worker with the fewest frames in flight takes the batch
+            in_flight = [0] * len(self.processes)
+            for _, _, worker in self.futures.values():
+                in_flight[worker] += 1
+            workers = [i for i, p in enumerate(self.processes) if p.is_alive()]
+            worker = min(workers or range(len(in_flight)), key=in_flight.__getitem__)
+            tasks = self.task_queues[worker]
+            reserved = []
+            for _ in items:
+                self.sequence += 1
+                future = Future()
+                slot = self.free_slots.pop()
+                self.futures[self.sequence] = (future, slot, worker)
+                reserved.append((self.sequence, slot, future))
+
+        batch = []
+        for (image, params), (sequence, slot, _) in zip(items, reserved):
+            memory = self.memories[slot]
+            if memory is None or memory.size < image.nbytes:
+                if memory is not None:
+                    memory.close()
+                    memory.unlink()
+                memory = shared_memory.SharedMemory(
+                    create=True, size=max(1, image.nbytes)
+                )
+                self.memories[slot] = memory
+            view = np.ndarray(image.shape, np.uint8, buffer=memory.buf)
+            np.copyto(view, image)
+            del view
+            batch.append((sequence, slot, memory.name, image.shape, params))
+
+        tasks.put(batch)
+        return [future for _, _, future in reserved]
+
+    def collect(self):
+        while True:
+            try:
+                result = self.results.get(timeout=0.5)
+            except queue.Empty:
+                result = []
+            if result is None or self.closed:
+                break
+            with self.condition:
+                finished = []
+                for sequence, _, boxes, elapsed_ms in result:
+                    # a worker counted as dead may still have sent results
+                    entry = self.futures.pop(sequence, None)
+                    if entry is None:
+                        continue
+                    future, slot, _ = entry
+                    # cascade time in the worker, for the auto-tuner
+                    future.detect_ms = elapsed_ms
+                    finished.append((future, boxes))
+                    self.free_slots.append(slot)
+                alive = self.replace_dead_workers(finished)
+                self.condition.notify_all()
+            for future, boxes in finished:
+                if isinstance(boxes, Exception):
+                    future.set_exception(boxes)
+                else:
+                    future.set_result(boxes)
+            if not alive:
+                print("Warning: Every detection worker has exited.")
+                break
+
+        with self.condition:
+            # submit() must not wait for slots that no worker will free
+            self.closed = True
+            self.condition.notify_all()
+            for future, _, _ in self.futures.values():
+                future.set_exception(RuntimeError("Detection workers have exited"))
+            self.futures.clear()
+
+    def replace_dead_workers(self, finished):
+        # under the condition; fails the frames of every dead worker and
+        # starts a new one, returns False once no worker is left
+        for index, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            lost = [seq for seq, entry in self.futures.items() if entry[2] == index]
+            for sequence in lost:
+                future, slot, _ = self.futures.pop(sequence)
+                error = RuntimeError(
+                    f"Detection worker exited with code {process.exitcode}"
+                )
+                finished.append((future, error))
+                self.free_slots.append(slot)
+            if self.restarts_left > 0:
+                self.restarts_left -= 1
+                print(f"Warning: Detection worker {index} exited, starting a new one.")
+                self.start_worker(index)
+        return any(process.is_alive() for process in self.processes)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        for tasks in self.task_queues:
+            tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        self.results.put(None)
+        self.result_thread.join(timeout=2)
+        for memory in self.memories:
+            if memory is not None:
+                memory.close()
+                memory.unlink()
+        self.memories = []
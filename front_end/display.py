@@ -1,12 +1,18 @@
+import math
 from PySide6.QtWidgets import (
     QVBoxLayout,
     QHBoxLayout,
+    QGridLayout,
     QWidget,
     QLabel,
     QSizePolicy,
     QSpacerItem,
+    QRubberBand,
+    QStyle,
 )
-from PySide6.QtCore import Qt
+from PySide6.QtGui import QPixmap
+from PySide6.QtCore import Qt, Signal, QTimer, QEvent, QRect, QObject
+from qt_adapter import DisplayPipeline
 
 
 class InfoDisplay(QWidget):
@@ -15,9 +21,12 @@ class InfoDisplay(QWidget):
         self.layout = QHBoxLayout(self)
 
         self.info_label = QLabel()
+        self.stats_label = QLabel()
+        self.stats_label.hide()
 
         self.setAttribute(Qt.WA_StyledBackground, True)
         self.info_label.setAttribute(Qt.WA_StyledBackground, True)
+        self.stats_label.setAttribute(Qt.WA_StyledBackground, True)
         
         self.info_label.setStyleSheet(
             """
@@ -30,6 +39,17 @@ class InfoDisplay(QWidget):
             """
         )
 
+        self.stats_label.setStyleSheet(
+            """
+                QLabel {
+                    background-color: none;
+                    color: white;
+                    font-size: 12px;
+                    font-family: monospace;
+                }
+            """
+        )
+
         self.setStyleSheet(
             """
             QWidget {
@@ -46,11 +66,84 @@ class InfoDisplay(QWidget):
         self.layout.addItem(horizontal_spacer)
         self.layout.addWidget(self.info_label)
         self.layout.addItem(horizontal_spacer)
+        self.layout.addWidget(self.stats_label)
 
         self.setFixedHeight((screen_geometry.height() - 50) * 0.19)
 
 
+class RoiSelector(QObject):
+    # Rubber-band selection on a label that shows a scaled frame. A drag
+    # emits the selection in fractions of the frame, a plain click cleared.
+    selected = Signal(float, float, float, float)
+    cleared = Signal()
+
+    def __init__(self, label):
+        super().__init__(label)
+        self.label = label
+        self.active = False
+        self.origin = None
+        self.rubber_band = QRubberBand(QRubberBand.Rectangle, label)
+        label.installEventFilter(self)
+
+    def start(self):
+        self.active = True
+        self.label.setCursor(Qt.CrossCursor)
+
+    def stop(self):
+        self.active = False
+        self.origin = None
+        self.rubber_band.hide()
+        self.label.unsetCursor()
+
+    def pixmap_rect(self):
+        pixmap = self.label.pixmap()
+        if pixmap is None or pixmap.isNull():
+            return None
+        return QStyle.alignedRect(
+            self.label.layoutDirection(),
+            self.label.alignment(),
+            pixmap.size(),
+            self.label.contentsRect(),
+        )
+
+    def eventFilter(self, watched, event):
+        if watched is not self.label or not self.active:
+            return super().eventFilter(watched, event)
+        if event.type() == QEvent.MouseButtonPress:
+            self.origin = event.position().toPoint()
+            self.rubber_band.setGeometry(QRect(self.origin, self.origin))
+            self.rubber_band.show()
+            return True
+        if event.type() == QEvent.MouseMove and self.origin is not None:
+            self.rubber_band.setGeometry(
+                QRect(self.origin, event.position().toPoint()).normalized()
+            )
+            return True
+        if event.type() == QEvent.MouseButtonRelease and self.origin is not None:
+            selection = QRect(self.origin, event.position().toPoint()).normalized()
+            area = self.pixmap_rect()
+            self.stop()
+            if area is None:
+                return True
+            selection = selection.intersected(area)
+            if selection.width() > 4 and selection.height() > 4:
+                self.selected.emit(
+                    (selection.x() - area.x()) / area.width(),
+                    (selection.y() - area.y()) / area.height(),
+                    selection.width() / area.width(),
+                    selection.height() / area.height(),
+                )
+            else:
+                self.cleared.emit()
+            return True
+        return super().eventFilter(watched, event)
+
+
 class ImageDisplay(QWidget):
+    resized = Signal(int, int)
+    # x, y, width, height as fractions of the shown frame
+    roiSelected = Signal(float, float, float, float)
+
     def __init__(self, screen_geometry):
         super().__init__()
         self.layout = QVBoxLayout(self)
@@ -78,6 +171,130 @@ class ImageDisplay(QWidget):
         self.layout.addWidget(self.image_label)
         self.setFixedHeight((screen_geometry.height() - 50) * 0.8)
 
+        self.roi_selector = RoiSelector(self.image_label)
+        self.roi_selector.selected.connect(self.roiSelected)
+
+    @property
+    def selecting_roi(self):
+        return self.roi_selector.active
+
+    def start_roi_selection(self):
+        self.roi_selector.start()
+
+    def stop_roi_selection(self):
+        self.roi_selector.stop()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        # the space frames can use, so the worker resizes straight to it
+        area = self.contentsRect().marginsRemoved(self.layout.contentsMargins())
+        self.resized.emit(area.width(), area.height())
+
+
+class SourceGrid(QWidget):
+    # One tile per source. Source threads post frames into a mailbox per
+    # tile; a GUI timer takes the newest frame of each at max_fps.
+    # name, x, y, width, height; an empty selection clears that tile's ROI
+    roiSelected = Signal(str, float, float, float, float)
+    roiCleared = Signal(str)
+
+    def __init__(self, screen_geometry, names, max_fps=30):
+        super().__init__()
+        self.layout = QGridLayout(self)
+        self.setAttribute(Qt.WA_StyledBackground, True)
+        self.setStyleSheet(
+            """
+                QWidget {
+                    background: qlineargradient(spread:pad, x1:0, y1:0, x2:1, y2:1, stop:0 rgba(70,70,70,1), stop:0.69 rgba(97,96,122,1), stop:1 rgba(110,120,159,1));
+                    border-radius: 15px;
+                }
+                QLabel {
+                    background: none;
+                    color: white;
+                    font-size: 14px;
+                    font-weight: 600;
+                }
+            """
+        )
+
+        self.columns = max(1, math.ceil(math.sqrt(len(names))))
+        self.rows = max(1, math.ceil(len(names) / self.columns))
+        self.stats = None
+        # tile name -> the source key its pipeline's ROI is stored under
+        self.source_keys = {}
+        self.roi_selectors = {}
+        self.pipelines = {}
+        self.image_labels = {}
+        self.caption_labels = {}
+        for index, name in enumerate(names):
+            image_label = QLabel()
+            image_label.setAlignment(Qt.AlignCenter)
+            caption_label = QLabel(name)
+            caption_label.setAlignment(Qt.AlignCenter)
+            tile = QVBoxLayout()
+            tile.addWidget(image_label, 1)
+            tile.addWidget(caption_label)
+            self.layout.addLayout(tile, index // self.columns, index % self.columns)
+            self.pipelines[name] = DisplayPipeline(max_fps=0)
+            self.image_labels[name] = image_label
+            self.caption_labels[name] = caption_label
+            roi_selector = RoiSelector(image_label)
+            roi_selector.selected.connect(
+                lambda *roi, name=name: self.finish_roi_selection(name, roi)
+            )
+            roi_selector.cleared.connect(
+                lambda name=name: self.finish_roi_selection(name)
+            )
+            self.roi_selectors[name] = roi_selector
+
+        self.setFixedHeight((screen_geometry.height() - 50) * 0.8)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(int(1000 / max_fps) if max_fps else 0)
+
+    @property
+    def selecting_roi(self):
+        return any(selector.active for selector in self.roi_selectors.values())
+
+    def start_roi_selection(self):
+        # the first tile dragged on gets the ROI
+        for selector in self.roi_selectors.values():
+            selector.start()
+
+    def stop_roi_selection(self):
+        for selector in self.roi_selectors.values():
+            selector.stop()
+
+    def finish_roi_selection(self, name, roi=None):
+        self.stop_roi_selection()
+        if roi is None:
+            self.roiCleared.emit(name)
+        else:
+            self.roiSelected.emit(name, *roi)
+
+    def post(self, name, count, cv_image):
+        # called from the source threads
+        self.pipelines[name].post(count, cv_image)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        area = self.contentsRect().marginsRemoved(self.layout.contentsMargins())
+        width = area.width() // self.columns - self.layout.spacing()
+        height = area.height() // self.rows - self.layout.spacing() - 30
+        for pipeline in self.pipelines.values():
+            pipeline.set_target_size(width, height)
+
+    def refresh(self):
+        stats = self.stats() if self.stats is not None else {}
+        for name, pipeline in self.pipelines.items():
+            frame = pipeline.take()
+            if frame is None:
+                continue
+            count, q_image = frame
+            self.image_labels[name].setPixmap(QPixmap.fromImage(q_image))
+            fps = stats.get(name, {}).get("fps", 0.0)
+            self.caption_labels[name].setText(f"{name}: {count} ({fps:.1f} FPS)")
+
 
 class Display(QWidget):
     def __init__(self, screen_geometry):
@@ -86,8 +303,10 @@ class Display(QWidget):
         self.layout.setContentsMargins(0, 0, 0, 32)
         self.layout.setSpacing(0)
 
+        self.screen_geometry = screen_geometry
         self.info_display = InfoDisplay(screen_geometry)
         self.image_display = ImageDisplay(screen_geometry)
+        self.source_grid = None
 
         vertical_spacer = QSpacerItem(
             20, 20, QSizePolicy.Minimum, QSizePolicy.Expanding
@@ -96,3 +315,10 @@ class Display(QWidget):
         self.layout.addWidget(self.info_display)
         self.layout.addItem(vertical_spacer)
         self.layout.addWidget(self.image_display)
+
+    def show_sources(self, names, max_fps=30):
+        # swaps the single image view for a grid with one tile per source
+        self.source_grid = SourceGrid(self.screen_geometry, names, max_fps)
+        self.image_display.hide()
+        self.layout.addWidget(self.source_grid)
+        return self.source_grid
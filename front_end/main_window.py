@@ -1,6 +1,6 @@
 from PySide6.QtWidgets import QMainWindow, QHBoxLayout, QWidget
-from PySide6.QtGui import QGuiApplication
-from PySide6.QtCore import Qt
+from PySide6.QtGui import QGuiApplication, QPixmap, QShortcut, QKeySequence
+from PySide6.QtCore import Qt, QTimer, Slot
 from front_end.display import Display
 from front_end.menu import Menu
 from back_end import UpdateImageThread, ImageProcessing
@@ -15,6 +15,19 @@ class MainWidget(QWidget):
         self.menu = Menu(self.display, screen_geometry, self.update_image_thread)
         self.layout.addWidget(self.menu, alignment=Qt.AlignTop)
         self.layout.addWidget(self.display)
+        self.display.image_display.resized.connect(
+            self.update_image_thread.display_pipeline.set_target_size
+        )
+        # connected once here; UniqueConnection keeps it idempotent
+        self.update_image_thread.frameReady.connect(
+            self.show_latest_frame, Qt.UniqueConnection
+        )
+        # runs for the whole session; sources change through commands
+        self.update_image_thread.start()
+        # video files: arrows seek, F switches between real time and fast
+        QShortcut(QKeySequence(Qt.Key_Left), self, lambda: self.seek_by(-5000))
+        QShortcut(QKeySequence(Qt.Key_Right), self, lambda: self.seek_by(5000))
+        QShortcut(QKeySequence(Qt.Key_F), self, self.toggle_video_realtime)
         self.setAttribute(Qt.WA_StyledBackground, True)
         self.setStyleSheet(
             """
@@ -24,6 +37,68 @@ class MainWidget(QWidget):
             """
         )
 
+    def seek_by(self, delta_ms):
+        self.update_image_thread.seek_by(delta_ms)
+
+    def toggle_video_realtime(self):
+        realtime = not self.update_image_thread.video_realtime
+        self.update_image_thread.set_video_realtime(realtime)
+
+    @Slot()
+    def show_latest_frame(self):
+        pipeline = self.update_image_thread.display_pipeline
+        wait = pipeline.wait_time()
+        if wait > 0:
+            # over the display rate: the mailbox keeps only the newest frame
+            QTimer.singleShot(int(wait * 1000) + 1, self.show_latest_frame)
+            return
+
+        frame = pipeline.take()
+        if frame is None:
+            return
+        n, q_image = frame
+        model = self.update_image_thread.image_processing.model
+        position = ""
+        if pipeline.timestamp_ms is not None:
+            minutes, seconds = divmod(pipeline.timestamp_ms / 1000, 60)
+            position = f"  ({int(minutes):02d}:{seconds:06.3f})"
+        if model == "faces":
+            self.display.info_display.info_label.setText(
+                f"Number of Faces: {n}{position}"
+            )
+        elif model == "eyes":
+            self.display.info_display.info_label.setText(
+                f"Number of Eyes: {n}{position}"
+            )
+        elif model == "faces+eyes":
+            self.display.info_display.info_label.setText(
+                f"Number of Faces: {n}{position}"
+            )
+
+        self.display.image_display.image_label.setPixmap(QPixmap.fromImage(q_image))
+        image_processing = self.update_image_thread.image_processing
+        if image_processing.profiler.enabled:
+            text = image_processing.profiler.overlay_text()
+            if image_processing.motion_gate is not None:
+                skip_ratio = image_processing.motion_gate.stats()["skip_ratio"]
+                text += f"\nmotion skip: {skip_ratio:.0%}"
+            stats = self.update_image_thread.frame_stats()
+            if "video_dropped_late" in stats:
+                text += (
+                    f"\nvideo: {stats['video_delivered']} shown, "
+                    f"{stats['video_dropped_late']} late dropped"
+                )
+            else:
+                text += (
+                    f"\ncapture: {stats['dropped_capture']} overwritten, "
+                    f"{stats['dropped_detection']} skipped"
+                )
+            text += (
+                f"\nframe pool: {stats['pool_reused']} reused, "
+                f"{stats['pool_allocated']} allocated"
+            )
+            self.display.info_display.stats_label.setText(text)
+
 
 class MainWindow(QMainWindow):
     def __init__(self):
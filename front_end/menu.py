@@ -1,4 +1,4 @@
-import time
+import os
 import cv2
 from PySide6.QtWidgets import (
     QPushButton,
@@ -9,10 +9,13 @@ from PySide6.QtWidgets import (
     QSlider,
     QSizePolicy,
     QFileDialog,
+    QInputDialog,
     QSpacerItem,
 )
-from PySide6.QtGui import QPixmap
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
+from telemetry import open_sink
+from autotune import LatencyAutoTuner
+from capture import VIDEO_EXTENSIONS
 
 # ----- buttons -----
 class MenuButton(QPushButton):
@@ -49,25 +52,18 @@ class OpenImageButton(MenuButton):
     def select_image(self):
         file_dialog = QFileDialog()
         file_dialog.setFileMode(QFileDialog.ExistingFile)
-        file_dialog.setNameFilter("Images (*.png *.jpg *.bmp)")
+        videos = " ".join(f"*{extension}" for extension in VIDEO_EXTENSIONS)
+        file_dialog.setNameFilters(
+            [
+                f"Images and videos (*.png *.jpg *.jpeg *.bmp {videos})",
+                "Images (*.png *.jpg *.jpeg *.bmp)",
+                f"Videos ({videos})",
+            ]
+        )
 
         if file_dialog.exec_() == QFileDialog.Accepted:
             selected_file = file_dialog.selectedFiles()[0]
-            self.update_image_thread.requestInterruption()
-            time.sleep(1)
-            self.update_image_thread.frameCaptured.connect(self.update_image_display)
-            self.update_image_thread.acquisition_local = "filesystem"
-            self.update_image_thread.file_path = selected_file
-            self.update_image_thread.start()
-
-    def update_image_display(self, n, q_image):
-        pixmap = QPixmap.fromImage(q_image)
-        if self.update_image_thread.image_processing.model == "faces":
-            self.display.info_display.info_label.setText(f"Number of Faces: {n}")
-        elif self.update_image_thread.image_processing.model == "eyes":
-            self.display.info_display.info_label.setText(f"Number of Eyes: {n}")
-
-        self.display.image_display.image_label.setPixmap(pixmap)
+            self.update_image_thread.open_file(selected_file)
 
 
 class OpenWebCamButton(MenuButton):
@@ -79,20 +75,7 @@ class OpenWebCamButton(MenuButton):
         self.clicked.connect(self.start_webcam)
 
     def start_webcam(self):
-        self.update_image_thread.requestInterruption()
-        time.sleep(1)
-        self.update_image_thread.acquisition_local = "webcam"
-        self.update_image_thread.frameCaptured.connect(self.update_image_display)
-        self.update_image_thread.start()
-
-    def update_image_display(self, n, q_image):
-        pixmap = QPixmap.fromImage(q_image)
-        if self.update_image_thread.image_processing.model == "faces":
-            self.display.info_display.info_label.setText(f"Number of Faces: {n}")
-        elif self.update_image_thread.image_processing.model == "eyes":
-            self.display.info_display.info_label.setText(f"Number of Eyes: {n}")
-
-        self.display.image_display.image_label.setPixmap(pixmap)
+        self.update_image_thread.open_camera(self.update_image_thread.camera_source)
 
 
 class ColouredImageButton(MenuButton):
@@ -102,7 +85,7 @@ class ColouredImageButton(MenuButton):
         self.clicked.connect(self.set_image_color_to_rgb)
 
     def set_image_color_to_rgb(self):
-        self.update_image_thread.image_processing.set_image_color("rgb")
+        self.update_image_thread.configure(set_image_color="rgb")
 
 
 class GrayScaleImageButton(MenuButton):
@@ -112,7 +95,7 @@ class GrayScaleImageButton(MenuButton):
         self.clicked.connect(self.set_image_color_to_gray)
 
     def set_image_color_to_gray(self):
-        self.update_image_thread.image_processing.set_image_color("gray")
+        self.update_image_thread.configure(set_image_color="gray")
 
 
 class FaceDetectionButton(MenuButton):
@@ -122,7 +105,7 @@ class FaceDetectionButton(MenuButton):
         self.clicked.connect(self.set_model_to_faces)
 
     def set_model_to_faces(self):
-        self.update_image_thread.image_processing.set_model("faces")
+        self.update_image_thread.configure(set_model="faces")
 
 
 class EyeDetectionButton(MenuButton):
@@ -132,7 +115,279 @@ class EyeDetectionButton(MenuButton):
         self.clicked.connect(self.set_model_to_eyes)
 
     def set_model_to_eyes(self):
-        self.update_image_thread.image_processing.set_model("eyes")
+        self.update_image_thread.configure(set_model="eyes")
+
+
+class FaceAndEyeDetectionButton(MenuButton):
+    def __init__(self, text, update_image_thread):
+        super().__init__(text)
+        self.update_image_thread = update_image_thread
+        self.clicked.connect(self.set_model_to_faces_and_eyes)
+
+    def set_model_to_faces_and_eyes(self):
+        self.update_image_thread.configure(set_model="faces+eyes")
+
+
+class EqualizationButton(MenuButton):
+    modes = ["none", "hist", "clahe"]
+
+    def __init__(self, update_image_thread):
+        super().__init__("Equalization: none")
+        self.update_image_thread = update_image_thread
+        # configure() applies between frames, so fast clicks must not read
+        # the mode back from image_processing
+        self.index = 0
+        self.clicked.connect(self.next_equalization)
+
+    def next_equalization(self):
+        self.index = (self.index + 1) % len(self.modes)
+        mode = self.modes[self.index]
+        self.update_image_thread.configure(set_equalization=mode)
+        self.setText(f"Equalization: {mode}")
+
+
+class ShowStatsButton(MenuButton):
+    def __init__(self, text, display, update_image_thread):
+        super().__init__(text)
+        self.display = display
+        self.update_image_thread = update_image_thread
+        self.clicked.connect(self.toggle_stats)
+
+    def toggle_stats(self):
+        profiler = self.update_image_thread.image_processing.profiler
+        profiler.set_enabled(not profiler.enabled)
+        if profiler.enabled:
+            profiler.reset()
+            self.setText("Hide Stats")
+            self.display.info_display.stats_label.show()
+        else:
+            self.setText("Show Stats")
+            self.display.info_display.stats_label.hide()
+
+
+class ExportStatsButton(MenuButton):
+    def __init__(self, text, update_image_thread):
+        super().__init__(text)
+        self.update_image_thread = update_image_thread
+        self.clicked.connect(self.export_stats)
+
+    def export_stats(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Stats", "stats.json", "JSON (*.json)"
+        )
+        if file_path:
+            self.update_image_thread.image_processing.profiler.export_json(file_path)
+
+
+class ConnectSerialButton(MenuButton):
+    labels = {"serial": "Serial", "udp": "UDP", "file": "File"}
+
+    def __init__(self, text, update_image_thread):
+        super().__init__(text)
+        self.update_image_thread = update_image_thread
+        self.sink_spec = "serial:COM10@57600"
+        self.clicked.connect(self.select_sink)
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.update_status)
+        self.status_timer.start(1000)
+
+    def select_sink(self):
+        spec, accepted = QInputDialog.getText(
+            self,
+            "Telemetry",
+            "serial:PORT@BAUD, udp:HOST:PORT or file:PATH",
+            text=self.sink_spec,
+        )
+        if not accepted:
+            return
+        try:
+            sink = open_sink(spec)
+        except ValueError as error:
+            self.setToolTip(str(error))
+            return
+        self.sink_spec = spec
+        self.update_image_thread.telemetry.set_sink(sink)
+
+    def update_status(self):
+        telemetry = self.update_image_thread.telemetry
+        label = self.labels.get(telemetry.sink.kind, "Telemetry")
+        self.setToolTip(telemetry.status)
+        self.setText(
+            f"{label} Connected" if telemetry.connected else f"Connect {label}"
+        )
+
+
+class AutoTuneButton(MenuButton):
+    def __init__(self, update_image_thread, target_ms=33.0):
+        super().__init__("Auto Tune: off")
+        self.update_image_thread = update_image_thread
+        self.target_ms = target_ms
+        # configure() applies between frames, so fast clicks must not read
+        # the state back from image_processing
+        self.enabled = False
+        self.clicked.connect(self.toggle_auto_tune)
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.update_status)
+        self.status_timer.start(500)
+
+    def toggle_auto_tune(self):
+        self.enabled = not self.enabled
+        autotuner = None
+        if self.enabled:
+            image_processing = self.update_image_thread.image_processing
+            autotuner = LatencyAutoTuner(image_processing, self.target_ms)
+        self.update_image_thread.configure(set_autotuner=autotuner)
+        self.update_status()
+
+    def update_status(self):
+        if not self.enabled:
+            self.setText("Auto Tune: off")
+            self.setToolTip("")
+            return
+        self.setText(f"Auto Tune: {self.target_ms:.0f} ms")
+        # None until the pipeline thread has applied the change
+        autotuner = self.update_image_thread.image_processing.autotuner
+        self.setToolTip(autotuner.status() if autotuner is not None else "")
+
+
+class RegionOfInterestButton(MenuButton):
+    def __init__(self, display, update_image_thread):
+        super().__init__("Draw ROI")
+        self.display = display
+        self.update_image_thread = update_image_thread
+        self.clicked.connect(self.toggle_roi)
+        self.display.image_display.roiSelected.connect(self.set_roi)
+        self.source_grid = None
+        # the ROI belongs to the current source, which can change under us
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.update_status)
+        self.status_timer.start(500)
+
+    def attach_grid(self, source_grid):
+        # with several sources, every tile has its own ROI: drag on a tile
+        # to set it, click a tile without dragging to clear it
+        self.source_grid = source_grid
+        source_grid.roiSelected.connect(self.set_tile_roi)
+        source_grid.roiCleared.connect(self.clear_tile_roi)
+        self.setToolTip("Drag on a tile to set its ROI, click a tile to clear it")
+        self.update_status()
+
+    def set_tile_roi(self, name, x, y, width, height):
+        source = self.source_grid.source_keys.get(name, name)
+        self.update_image_thread.configure(
+            set_source_roi=(source, (x, y, width, height))
+        )
+
+    def clear_tile_roi(self, name):
+        source = self.source_grid.source_keys.get(name, name)
+        self.update_image_thread.configure(set_source_roi=(source, None))
+
+    def toggle_roi(self):
+        if self.source_grid is not None:
+            if self.source_grid.selecting_roi:
+                self.source_grid.stop_roi_selection()
+            else:
+                self.source_grid.start_roi_selection()
+            self.update_status()
+            return
+        image_display = self.display.image_display
+        if image_display.selecting_roi:
+            image_display.stop_roi_selection()
+        elif self.update_image_thread.image_processing.roi is not None:
+            self.update_image_thread.configure(set_roi=None)
+        else:
+            image_display.start_roi_selection()
+        self.update_status()
+
+    def set_roi(self, x, y, width, height):
+        self.update_image_thread.configure(set_roi=(x, y, width, height))
+        self.update_status()
+
+    def update_status(self):
+        if self.source_grid is not None:
+            selecting = self.source_grid.selecting_roi
+            self.setText("Drag on a tile..." if selecting else "Draw ROI")
+        elif self.display.image_display.selecting_roi:
+            self.setText("Drag on the image...")
+        elif self.update_image_thread.image_processing.roi is not None:
+            self.setText("Clear ROI")
+        else:
+            self.setText("Draw ROI")
+
+
+class ObjectSizeButton(MenuButton):
+    def __init__(self, text, update_image_thread):
+        super().__init__(text)
+        self.update_image_thread = update_image_thread
+        self.clicked.connect(self.select_sizes)
+
+    def select_sizes(self):
+        image_processing = self.update_image_thread.image_processing
+        current = [image_processing.min_size, image_processing.max_size]
+        text = "-".join(str(size[0]) if size else "0" for size in current)
+        text, accepted = QInputDialog.getText(
+            self,
+            "Object Size",
+            "MIN-MAX object width in frame pixels (0 = no limit)",
+            text=text,
+        )
+        if not accepted:
+            return
+        try:
+            min_side, max_side = (int(value) for value in text.split("-"))
+        except ValueError:
+            self.setToolTip(f"Expected MIN-MAX, got {text}")
+            return
+        calls = {}
+        if min_side > 0:
+            # the auto tuner manages min_size itself
+            calls["set_autotuner"] = None
+        calls["set_min_size"] = (min_side, min_side) if min_side > 0 else None
+        calls["set_max_size"] = (max_side, max_side) if max_side > 0 else None
+        self.update_image_thread.configure(**calls)
+        self.setToolTip(f"{min_side or '-'} to {max_side or '-'} px")
+
+
+class RecordButton(MenuButton):
+    def __init__(self, text, update_image_thread):
+        super().__init__(text)
+        self.update_image_thread = update_image_thread
+        self.record_options = {}
+        self.clicked.connect(self.toggle_recording)
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.update_status)
+        self.status_timer.start(1000)
+
+    def toggle_recording(self):
+        if self.update_image_thread.recorder is not None:
+            self.update_image_thread.stop_recording()
+            self.update_status()
+            return
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Record", "recording.mp4", "MP4 video (*.mp4)"
+        )
+        if file_path:
+            # segments are numbered: recording_001.mp4 + recording_001.jsonl, ...
+            prefix = os.path.splitext(file_path)[0]
+            self.update_image_thread.start_recording(prefix, **self.record_options)
+            self.update_status()
+
+    def update_status(self):
+        recorder = self.update_image_thread.recorder
+        if recorder is None:
+            self.setText("Record")
+            return
+        stats = recorder.stats()
+        if stats["error"]:
+            self.update_image_thread.stop_recording()
+            self.setText("Record")
+            self.setToolTip(f"Recording failed: {stats['error']}")
+            return
+        self.setText(f"Stop Recording ({stats['written']})")
+        self.setToolTip(
+            f"{stats['segment_path']}: {stats['dropped']} dropped, "
+            f"{stats['segments']} segments"
+        )
 
 
 # ----- sliders -----
@@ -177,6 +432,10 @@ class ScaleFactorSlider(QWidget):
         self.slider.setValue(150)
         self.slider.setSingleStep(1)
         self.slider.valueChanged.connect(self.set_scale_factor)
+        # follows values chosen by the auto tuner
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self.sync_value)
+        self.sync_timer.start(500)
 
         vertical_spacer = QSpacerItem(
             20, 20, QSizePolicy.Minimum, QSizePolicy.Expanding
@@ -200,7 +459,16 @@ class ScaleFactorSlider(QWidget):
     def set_scale_factor(self):
         value = self.slider.value() / 100
         self.info_label.setText(f"({round(value, 2)})")
-        self.update_image_thread.image_processing.set_scale_factor(value)
+        # a manual change takes over from the auto tuner
+        self.update_image_thread.configure(set_autotuner=None, set_scale_factor=value)
+
+    def sync_value(self):
+        value = self.update_image_thread.image_processing.scale_factor
+        if round(value * 100) != self.slider.value():
+            self.slider.blockSignals(True)
+            self.slider.setValue(round(value * 100))
+            self.slider.blockSignals(False)
+            self.info_label.setText(f"({round(value, 2)})")
 
 
 class MinNeighborsSlider(QWidget):
@@ -237,6 +505,10 @@ class MinNeighborsSlider(QWidget):
         self.slider.setValue(5)
         self.slider.setSingleStep(1)
         self.slider.valueChanged.connect(self.set_min_neighbors)
+        # follows values chosen by the auto tuner
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self.sync_value)
+        self.sync_timer.start(500)
 
         vertical_spacer = QSpacerItem(
             20, 20, QSizePolicy.Minimum, QSizePolicy.Expanding
@@ -260,7 +532,16 @@ class MinNeighborsSlider(QWidget):
     def set_min_neighbors(self):
         value = self.slider.value()
         self.info_label.setText(f"({round(value, 2)})")
-        self.update_image_thread.image_processing.set_min_neighbors(value)
+        # a manual change takes over from the auto tuner
+        self.update_image_thread.configure(set_autotuner=None, set_min_neighbors=value)
+
+    def sync_value(self):
+        value = self.update_image_thread.image_processing.min_neighbors
+        if value != self.slider.value():
+            self.slider.blockSignals(True)
+            self.slider.setValue(value)
+            self.slider.blockSignals(False)
+            self.info_label.setText(f"({round(value, 2)})")
 
 
 # ---- button menu ----
@@ -276,7 +557,17 @@ class ButtonsMenu(QWidget):
         self.button4 = GrayScaleImageButton("Gray Scale Image", update_image_thread)
         self.button5 = FaceDetectionButton("Detect Faces", update_image_thread)
         self.button6 = EyeDetectionButton("Detect Eyes", update_image_thread)
-        self.button7 = MenuButton("Connect Serial")
+        self.button7 = FaceAndEyeDetectionButton(
+            "Detect Faces + Eyes", update_image_thread
+        )
+        self.button8 = EqualizationButton(update_image_thread)
+        self.button9 = ShowStatsButton("Show Stats", display, update_image_thread)
+        self.button10 = ExportStatsButton("Export Stats", update_image_thread)
+        self.button11 = ConnectSerialButton("Connect Serial", update_image_thread)
+        self.button12 = AutoTuneButton(update_image_thread)
+        self.button13 = RegionOfInterestButton(display, update_image_thread)
+        self.button14 = ObjectSizeButton("Object Size", update_image_thread)
+        self.button15 = RecordButton("Record", update_image_thread)
 
         self.layout.addWidget(self.button1)
         self.layout.addWidget(self.button2)
@@ -285,6 +576,14 @@ class ButtonsMenu(QWidget):
         self.layout.addWidget(self.button5)
         self.layout.addWidget(self.button6)
         self.layout.addWidget(self.button7)
+        self.layout.addWidget(self.button8)
+        self.layout.addWidget(self.button9)
+        self.layout.addWidget(self.button10)
+        self.layout.addWidget(self.button11)
+        self.layout.addWidget(self.button12)
+        self.layout.addWidget(self.button13)
+        self.layout.addWidget(self.button14)
+        self.layout.addWidget(self.button15)
 
         self.setStyleSheet(
             """
@@ -294,7 +593,7 @@ class ButtonsMenu(QWidget):
         """
         )
 
-        self.setFixedHeight(350)
+        self.setFixedHeight(685)
 
 
 # ---- slider menu ----
@@ -0,0 +1,477 @@
+import time
+from collections import deque
+from concurrent.futures import wait
+import cv2
+import numpy as np
+from tracking import TemplateTracker
+from profiling import StageProfiler
+from motion import overlaps
+from detection import (
+    FACE_CASCADE_PATH,
+    EYE_CASCADE_PATH,
+    detect_boxes,
+    draw_boxes,
+    draw_results,
+    load_cascade,
+    roi_box,
+    scale_results,
+)
+
+
+class ImageProcessing:
+    def __init__(self) -> None:
+        self.model = "faces"
+        self.image_color = "rgb"
+        self.scale_factor = 1.5
+        self.min_neighbors = 5
+        self.detection_max_width = None
+        self.detection_scale = 1.0
+        self.min_size = None
+        self.max_size = None
+        self.autotuner = None
+        # regions of interest per source (camera, file or stream spec)
+        self.source = None
+        self.rois = {}
+        self.equalization = "none"
+        self.clahe = None
+        self.buffers = {}
+        self.executor = None
+        # workers of the executor that serve this ImageProcessing
+        self.pool_workers = 1
+        self.pending = deque()
+        self.detect_interval = 1
+        self.tracker = TemplateTracker()
+        self.tracked_frames = 0
+        self.tracked_key = None
+        self.tracked_results = None
+        # the executor path decides at submit time which frames are tracked
+        self.submitted_key = None
+        self.submitted_frames = 0
+        self.motion_gate = None
+        self.tiling = None
+        # whole-frame gray copy at reduced resolution, for the tiling
+        # candidate pass; only set during one process_image() call
+        self.reduced_image = None
+        self.gated_key = None
+        self.gated_results = None
+        self.last_results = []
+        self.profiler = StageProfiler()
+
+    @property
+    def face_cascade(self):
+        return load_cascade(FACE_CASCADE_PATH)
+
+    @property
+    def eye_cascade(self):
+        return load_cascade(EYE_CASCADE_PATH)
+
+    def set_image_color(self, image_color):
+        self.image_color = image_color
+
+    def set_model(self, model):
+        self.model = model
+
+    def set_scale_factor(self, scale_factor):
+        self.scale_factor = scale_factor
+
+    def set_min_neighbors(self, min_neighbors):
+        self.min_neighbors = min_neighbors
+
+    def set_detection_max_width(self, detection_max_width):
+        self.detection_max_width = detection_max_width
+
+    def set_detection_scale(self, detection_scale):
+        self.detection_scale = detection_scale
+
+    def set_min_size(self, min_size):
+        self.min_size = min_size
+
+    def set_max_size(self, max_size):
+        self.max_size = max_size
+
+    def set_source(self, source):
+        self.source = source
+        # the motion background belongs to the previous source
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+
+    def set_roi(self, roi):
+        # (x, y, w, h) in fractions of the frame, None searches everywhere
+        self.set_source_roi((self.source, roi))
+
+    def set_source_roi(self, source_roi):
+        # (source, roi) for any source, e.g. one tile of the source grid
+        source, roi = source_roi
+        if roi is None:
+            self.rois.pop(source, None)
+        else:
+            self.rois[source] = tuple(roi)
+
+    @property
+    def roi(self):
+        return self.rois.get(self.source)
+
+    def set_autotuner(self, autotuner):
+        self.autotuner = autotuner
+        if autotuner is not None:
+            autotuner.apply()
+
+    def set_equalization(self, equalization):
+        self.equalization = equalization
+
+    def set_executor(self, executor):
+        # executors can be shared, so closing one is left to whoever made it
+        self.flush()
+        self.executor = executor
+        self.pool_workers = len(executor.processes) if executor is not None else 1
+
+    def set_motion_gate(self, motion_gate):
+        self.motion_gate = motion_gate
+        self.gated_key = None
+
+    def set_tiling(self, tiling):
+        # a TiledDetector for large stills, None searches in one piece
+        self.tiling = tiling
+
+    def set_detect_interval(self, detect_interval):
+        self.detect_interval = max(1, int(detect_interval))
+        self.tracker.reset()
+        self.tracked_key = None
+        self.submitted_key = None
+
+    def reused_buffer(self, name, shape):
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape:
+            buffer = np.empty(shape, np.uint8)
+            self.buffers[name] = buffer
+        return buffer
+
+    def detection_input(self, cv_image):
+        # the cascades always get a single-channel image, whatever the display color
+        height, width = cv_image.shape[:2]
+        if len(cv_image.shape) == 3:
+            gray = self.reused_buffer("gray", (height, width))
+            cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY, dst=gray)
+        else:
+            gray = cv_image
+
+        ratio = self.detection_scale
+        if self.detection_max_width and width * ratio > self.detection_max_width:
+            ratio = self.detection_max_width / width
+        if ratio < 1.0:
+            size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+            small = self.reused_buffer("small", (size[1], size[0]))
+            cv2.resize(gray, size, dst=small, interpolation=cv2.INTER_AREA)
+            gray = small
+        else:
+            ratio = 1.0
+
+        # only the region of interest reaches the cascades; offset maps the
+        # boxes back to the frame
+        offset = (0, 0)
+        roi = self.roi
+        if roi is not None:
+            x, y, w, h = roi_box(roi, gray.shape[1], gray.shape[0])
+            gray = gray[y : y + h, x : x + w]
+            offset = (x, y)
+
+        if self.equalization == "none":
+            return gray, ratio, offset
+
+        # equalize into its own buffer so a gray display frame stays untouched
+        equalized = self.reused_buffer("equalized", gray.shape)
+        if self.equalization == "hist":
+            cv2.equalizeHist(gray, dst=equalized)
+        elif self.equalization == "clahe":
+            if self.clahe is None:
+                self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+            self.clahe.apply(gray, dst=equalized)
+        else:
+            print(
+                f"Warning: Unrecognized equalization {self.equalization}. Using default (none)."
+            )
+            return gray, ratio, offset
+        return equalized, ratio, offset
+
+    def find(self, cv_image, model):
+        with self.profiler.stage("gray"):
+            small, ratio, offset = self.detection_input(cv_image)
+        results = self.run_gated(small, model, ratio, cv_image.shape[1])
+        return scale_results(results, ratio, model, offset)
+
+    def cascade_params(self, model, ratio):
+        # sizes are set in full-resolution pixels, the cascade sees the
+        # downscaled image
+        def scaled(size):
+            if not size:
+                return None
+            return tuple(max(1, int(round(v * ratio))) for v in size)
+
+        return (
+            model,
+            self.scale_factor,
+            self.min_neighbors,
+            scaled(self.min_size),
+            scaled(self.max_size),
+        )
+
+    def run_cascades(self, small, model, ratio):
+        return detect_boxes(
+            self.face_cascade,
+            self.eye_cascade,
+            small,
+            *self.cascade_params(model, ratio),
+        )
+
+    def run_gated(self, small, model, ratio, frame_width):
+        # with a motion gate, a static scene reuses the last results and a
+        # local change is only searched around where it happened
+        regions = None
+        if self.motion_gate is not None:
+            with self.profiler.stage("motion"):
+                regions = self.motion_gate.update(small)
+            # another source of the same size must not reuse these results
+            key = (
+                self.source,
+                self.cascade_params(model, ratio),
+                small.shape,
+                self.equalization,
+                self.roi,
+            )
+            if key != self.gated_key:
+                regions = None
+            self.gated_key = key
+
+        if regions == []:
+            return self.gated_results
+
+        start = time.perf_counter()
+        with self.profiler.stage("detect"):
+            if (
+                regions is None
+                and self.tiling is not None
+                and self.tiling.applies(small)
+            ):
+                results = self.tiling.detect(
+                    self, small, model, ratio, self.reduced_image
+                )
+            elif regions is None:
+                results = self.run_cascades(small, model, ratio)
+            else:
+                # boxes away from the motion are still valid
+                results = [
+                    result
+                    for result in self.gated_results
+                    if not any(
+                        overlaps(result[0] if model == "faces+eyes" else result, region)
+                        for region in regions
+                    )
+                ]
+                for x, y, w, h in regions:
+                    found = self.run_cascades(small[y : y + h, x : x + w], model, ratio)
+                    results += scale_results(found, 1.0, model, (x, y))
+        # partial searches are cheaper and would mislead the tuner
+        if self.autotuner is not None and regions is None:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.autotuner.observe(elapsed_ms, frame_width)
+        self.gated_results = results
+        return results
+
+    def find_tracked(self, cv_image, model):
+        # detect every detect_interval frames and track the boxes in between
+        if self.detect_interval <= 1:
+            return self.find(cv_image, model)
+
+        with self.profiler.stage("gray"):
+            small, ratio, offset = self.detection_input(cv_image)
+        key = self.tracking_key(model, ratio, offset, small)
+        if key == self.tracked_key and self.tracked_frames < self.detect_interval:
+            results = self.track(small, model)
+            if results is not None:
+                self.tracked_frames += 1
+                return scale_results(results, ratio, model, offset)
+
+        results = self.run_gated(small, model, ratio, cv_image.shape[1])
+        self.start_tracking(small, model, key, results)
+        return scale_results(results, ratio, model, offset)
+
+    def tracking_key(self, model, ratio, offset, small):
+        return (
+            self.source,
+            self.cascade_params(model, ratio),
+            ratio,
+            offset,
+            small.shape,
+            self.equalization,
+        )
+
+    def start_tracking(self, small, model, key, results):
+        tracked = [face for face, _ in results] if model == "faces+eyes" else results
+        self.tracker.start(small, tracked)
+        self.tracked_key = key
+        self.tracked_results = results
+        self.tracked_frames = 1
+
+    def track(self, small, model):
+        # results of the last detection moved to small, None when lost
+        with self.profiler.stage("track"):
+            tracked = self.tracker.update(small)
+        if tracked is None or model != "faces+eyes":
+            return tracked
+        return [
+            (
+                box,
+                [
+                    (ex + box[0] - face[0], ey + box[1] - face[1], ew, eh)
+                    for ex, ey, ew, eh in eyes
+                ],
+            )
+            for box, (face, eyes) in zip(tracked, self.tracked_results)
+        ]
+
+    def find_faces(self, cv_image):
+        return self.find(cv_image, "faces")
+
+    def find_eyes(self, cv_image):
+        return self.find(cv_image, "eyes")
+
+    def find_faces_and_eyes(self, cv_image):
+        return self.find(cv_image, "faces+eyes")
+
+    def annotate(self, cv_image, model, results):
+        # returns plain arrays; converting to QImage is up to qt_adapter
+        with self.profiler.stage("draw"):
+            draw_results(cv_image, model, results)
+            roi = self.roi
+            if roi is not None:
+                height, width = cv_image.shape[:2]
+                draw_boxes(cv_image, [roi_box(roi, width, height)], (255, 255, 0))
+        self.last_results = results
+        return len(results), cv_image
+
+    def detect_faces(self, cv_image):
+        return self.annotate(cv_image, "faces", self.find_tracked(cv_image, "faces"))
+
+    def detect_eyes(self, cv_image):
+        return self.annotate(cv_image, "eyes", self.find_tracked(cv_image, "eyes"))
+
+    def detect_faces_and_eyes(self, cv_image):
+        return self.annotate(
+            cv_image, "faces+eyes", self.find_tracked(cv_image, "faces+eyes")
+        )
+
+    def display_image(self, cv_image, reuse_output=False):
+        if self.image_color == "gray":
+            if reuse_output:
+                gray = self.reused_buffer("display_gray", cv_image.shape[:2])
+                return cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY, dst=gray)
+            return cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+        elif self.image_color != "rgb":
+            print(
+                f"Warning: Unrecognized color format {self.image_color}. Using default (RGB)."
+            )
+        return cv_image
+
+    def submit_frame(self, cv_image):
+        # hands the frame to the executor; results come back from finished_frames.
+        # With a detect interval, only every detect_interval-th frame goes to
+        # the executor and the frames in between are tracked, in order, once
+        # the detection before them is back
+        cv_image = self.display_image(cv_image)
+        small, ratio, offset = self.detection_input(cv_image)
+        model = self.model
+        future = None
+        key = None
+        if self.detect_interval > 1:
+            key = self.tracking_key(model, ratio, offset, small)
+            # the buffers behind small are reused by the next frame
+            small = small.copy()
+        if (
+            key is None
+            or key != self.submitted_key
+            or (self.submitted_frames >= self.detect_interval)
+        ):
+            future = self.executor.submit(small, self.cascade_params(model, ratio))
+            self.submitted_key = key
+            self.submitted_frames = 0
+        self.submitted_frames += 1
+        self.pending.append((future, cv_image, ratio, offset, model, small, key))
+
+    def finished_frames(self, block=False):
+        # pending is in submission order, so frames come out in sequence
+        finished = []
+        while self.pending and (
+            block or self.pending[0][0] is None or self.pending[0][0].done()
+        ):
+            future, cv_image, ratio, offset, model, small, key = self.pending.popleft()
+            if future is None:
+                results = self.track(small, model) if key == self.tracked_key else None
+                if results is None:
+                    # lost: detect here rather than show a frame without boxes
+                    results = self.run_cascades(small, model, ratio)
+                    self.start_tracking(small, model, key, results)
+                results = scale_results(results, ratio, model, offset)
+                finished.append(self.annotate(cv_image, model, results))
+                block = False
+                continue
+            try:
+                boxes = future.result()
+            except (RuntimeError, cv2.error) as error:
+                # the frame still goes out, in order, without detections
+                print(f"Warning: Detection failed for a frame: {error}")
+                boxes = []
+            if key is not None:
+                self.start_tracking(small, model, key, boxes)
+            results = scale_results(boxes, ratio, model, offset)
+            detect_ms = getattr(future, "detect_ms", None)
+            if self.autotuner is not None and detect_ms is not None:
+                # with every worker busy, each one's cascade time is shared
+                # by pool_workers frames
+                self.autotuner.observe(detect_ms / self.pool_workers, cv_image.shape[1])
+            finished.append(self.annotate(cv_image, model, results))
+            block = False
+        return finished
+
+    def flush(self, timeout=5.0):
+        # drops the frames still in the pool; a frame no worker finishes in
+        # time must not hang a source switch or shutdown
+        deadline = time.perf_counter() + timeout
+        while self.pending:
+            future = self.pending[0][0]
+            if future is None:
+                # dropped anyway, no need to track it
+                self.pending.popleft()
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or not wait([future], remaining).done:
+                print("Warning: Detection pool did not finish, dropping its frames.")
+                self.pending.clear()
+                return
+            self.finished_frames()
+
+    def process_image(self, cv_image, reuse_output=False, reduced=None):
+        # reuse_output: a gray result lives in a buffer that the next call
+        # overwrites, for callers that are done with each frame right away;
+        # reduced: see TiledDetector.read_reduced()
+        self.reduced_image = reduced
+        try:
+            return self.detect_image(cv_image, reuse_output)
+        finally:
+            self.reduced_image = None
+
+    def detect_image(self, cv_image, reuse_output):
+        with self.profiler.stage("color"):
+            cv_image = self.display_image(cv_image, reuse_output)
+
+        if self.model == "faces":
+            return self.detect_faces(cv_image)
+        elif self.model == "eyes":
+            return self.detect_eyes(cv_image)
+        elif self.model == "faces+eyes":
+            return self.detect_faces_and_eyes(cv_image)
+        else:
+            print(
+                f"Warning: Unrecognized model type {self.model}. Using default (faces)."
+            )
+            self.last_results = []
+            return 0, cv_image
@@ -1,13 +1,180 @@
 import sys
+import argparse
 import back_end
+from detection_pool import ProcessPoolDetectionExecutor
+from sources import SourceManager
+from telemetry import open_sink
+from motion import MotionGate
+from tiling import TiledDetector
 from PySide6.QtWidgets import QApplication
 from front_end.main_window import MainWindow
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers", type=int, default=0, help="detection worker processes (0 = inline)"
+    )
+    parser.add_argument(
+        "--detect-every",
+        type=int,
+        default=1,
+        help="run the cascade every N webcam frames and track boxes in between",
+    )
+    parser.add_argument(
+        "--max-display-fps",
+        type=float,
+        default=30,
+        help="upper bound on frames drawn by the GUI (0 = unlimited)",
+    )
+    parser.add_argument(
+        "--source",
+        action="append",
+        default=[],
+        help="camera index, video file or image glob; repeat for a grid of sources",
+    )
+    parser.add_argument(
+        "--telemetry",
+        default="serial:COM10@57600",
+        help="count sink: serial:PORT@BAUD, udp:HOST:PORT or file:PATH",
+    )
+    parser.add_argument(
+        "--telemetry-framing", choices=["text", "binary"], default="text"
+    )
+    parser.add_argument(
+        "--auto-fps",
+        type=float,
+        default=0,
+        help="tune detection settings to reach this frame rate (0 = manual sliders)",
+    )
+    parser.add_argument(
+        "--motion-gate",
+        action="store_true",
+        help="skip detection on static frames and search only where things moved",
+    )
+    parser.add_argument(
+        "--motion-threshold",
+        type=int,
+        default=25,
+        help="gray level change that counts as motion",
+    )
+    parser.add_argument(
+        "--motion-min-area",
+        type=float,
+        default=0.002,
+        help="fraction of the frame that has to change before detection runs",
+    )
+    parser.add_argument(
+        "--video-mode",
+        choices=["realtime", "fast"],
+        default="realtime",
+        help="video files: keep wall-clock sync by dropping late frames, or process every frame",
+    )
+    parser.add_argument(
+        "--record", help="record annotated frames to PREFIX_001.mp4/.jsonl, ..."
+    )
+    parser.add_argument("--record-fps", type=float, default=None)
+    parser.add_argument(
+        "--record-max-mb",
+        type=float,
+        default=None,
+        help="start a new segment after this size",
+    )
+    parser.add_argument(
+        "--record-max-seconds",
+        type=float,
+        default=None,
+        help="start a new segment after this duration",
+    )
+    parser.add_argument(
+        "--tile-large-images",
+        type=float,
+        default=0,
+        metavar="MEGAPIXELS",
+        help="search images this large in overlapping tiles on all cores (0 = off)",
+    )
+    parser.add_argument(
+        "--tile-reduce",
+        type=int,
+        choices=[2, 4, 8],
+        default=None,
+        help="tiled images: find candidates at 1/N resolution first, refine only around them",
+    )
+    args = parser.parse_args()
+
     # aplicação
     app = QApplication([])
     main_window = MainWindow()
+    update_image_thread = main_window.main_widget.update_image_thread
+    update_image_thread.display_pipeline.set_max_fps(args.max_display_fps)
+    update_image_thread.telemetry.set_framing(args.telemetry_framing)
+    update_image_thread.telemetry.set_sink(open_sink(args.telemetry))
+    main_window.main_widget.menu.buttons_menu.button11.sink_spec = args.telemetry
+    update_image_thread.set_video_realtime(args.video_mode == "realtime")
+    record_options = {}
+    if args.record_fps:
+        record_options["fps"] = args.record_fps
+    if args.record_max_mb:
+        record_options["max_bytes"] = int(args.record_max_mb * 1024 * 1024)
+    if args.record_max_seconds:
+        record_options["max_seconds"] = args.record_max_seconds
+    main_window.main_widget.menu.buttons_menu.button15.record_options = record_options
+    if args.record and not args.source:
+        update_image_thread.start_recording(args.record, **record_options)
+    # stops the pipeline, then the recording; devices are released on the way out
+    app.aboutToQuit.connect(update_image_thread.stop)
+    image_processing = update_image_thread.image_processing
+    update_image_thread.configure(set_detect_interval=args.detect_every)
+    if args.motion_gate:
+        update_image_thread.configure(
+            set_motion_gate=MotionGate(
+                threshold=args.motion_threshold, min_area=args.motion_min_area
+            )
+        )
+    if args.tile_large_images > 0:
+        tiling = TiledDetector(
+            min_pixels=int(args.tile_large_images * 1_000_000), reduce=args.tile_reduce
+        )
+        update_image_thread.configure(set_tiling=tiling)
+        app.aboutToQuit.connect(tiling.close)
+    if args.auto_fps > 0:
+        auto_tune_button = main_window.main_widget.menu.buttons_menu.button12
+        auto_tune_button.target_ms = 1000 / args.auto_fps
+        auto_tune_button.toggle_auto_tune()
+    if args.source:
+        # the sliders and buttons keep driving every source through image_processing
+        grid = main_window.main_widget.display.show_sources(
+            [f"source {index}" for index in range(len(args.source))],
+            args.max_display_fps,
+        )
+        source_manager = SourceManager(
+            args.source,
+            args.workers,
+            settings=image_processing,
+            on_frame=grid.post,
+            telemetry=update_image_thread.telemetry,
+        )
+        grid.stats = source_manager.stats
+        grid.source_keys = {
+            pipeline.name: str(pipeline.spec) for pipeline in source_manager.pipelines
+        }
+        buttons_menu = main_window.main_widget.menu.buttons_menu
+        buttons_menu.button13.attach_grid(grid)
+        # recording and the stats overlay follow the single-source pipeline
+        if args.record:
+            print("Warning: --record is not supported with --source, ignoring it.")
+        for button in (
+            buttons_menu.button9,
+            buttons_menu.button10,
+            buttons_menu.button15,
+        ):
+            button.setEnabled(False)
+        source_manager.start()
+        app.aboutToQuit.connect(source_manager.stop)
+    elif args.workers > 0:
+        executor = ProcessPoolDetectionExecutor(workers=args.workers)
+        update_image_thread.configure(set_executor=executor)
+        app.aboutToQuit.connect(executor.close)
 
     main_window.show()
 
@@ -0,0 +1,144 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    # Decides from a tiny, blurred copy of each frame whether the cascades
+    # need to run. The frame is compared against a running-average
+    # background: update() returns [] when nothing changed, a list of padded
+    # (x, y, w, h) boxes around the changes, or None when the whole frame
+    # has to be searched (first frame, or too much of it changed).
+    def __init__(
+        self,
+        width=64,
+        threshold=25,
+        min_area=0.002,
+        max_area=0.4,
+        learning_rate=0.05,
+        padding=0.5,
+        min_region=0.3,
+    ):
+        self.width = width
+        self.threshold = threshold
+        self.min_area = min_area
+        self.max_area = max_area
+        self.learning_rate = learning_rate
+        self.padding = padding
+        self.min_region = min_region
+        self.tiny = None
+        self.diff = None
+        self.mask = None
+        self.background = None
+        self.frames = 0
+        self.skipped = 0
+        self.partial = 0
+
+    def reset(self):
+        self.background = None
+
+    def copy(self):
+        # same thresholds, own background: one gate per video stream
+        return MotionGate(
+            self.width,
+            self.threshold,
+            self.min_area,
+            self.max_area,
+            self.learning_rate,
+            self.padding,
+            self.min_region,
+        )
+
+    def set_threshold(self, threshold):
+        self.threshold = threshold
+
+    def set_min_area(self, min_area):
+        self.min_area = min_area
+
+    def update(self, gray):
+        height, width = gray.shape[:2]
+        size = (self.width, max(1, round(height * self.width / width)))
+        if self.tiny is None or self.tiny.shape != (size[1], size[0]):
+            self.tiny = np.empty((size[1], size[0]), np.uint8)
+            self.diff = np.empty_like(self.tiny)
+            self.mask = np.empty_like(self.tiny)
+            self.background = None
+        cv2.resize(gray, size, dst=self.tiny, interpolation=cv2.INTER_AREA)
+        cv2.GaussianBlur(self.tiny, (5, 5), 0, dst=self.tiny)
+        self.frames += 1
+
+        if self.background is None:
+            self.background = self.tiny.astype(np.float32)
+            return None
+        cv2.absdiff(self.tiny, cv2.convertScaleAbs(self.background), dst=self.diff)
+        cv2.accumulateWeighted(self.tiny, self.background, self.learning_rate)
+        cv2.threshold(self.diff, self.threshold, 255, cv2.THRESH_BINARY, dst=self.mask)
+
+        changed = cv2.countNonZero(self.mask) / self.mask.size
+        if changed < self.min_area:
+            self.skipped += 1
+            return []
+        if changed > self.max_area:
+            # a new scene: it becomes the reference for the results about to
+            # be computed, instead of fading in over many frames
+            self.background[:] = self.tiny
+            return None
+
+        self.partial += 1
+        contours, _ = cv2.findContours(
+            cv2.dilate(self.mask, None, iterations=2),
+            cv2.RETR_EXTERNAL,
+            cv2.CHAIN_APPROX_SIMPLE,
+        )
+        scale_x = width / size[0]
+        scale_y = height / size[1]
+        min_side = self.min_region * min(width, height)
+        regions = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            x, y, w, h = x * scale_x, y * scale_y, w * scale_x, h * scale_y
+            # room for a whole face around the change, not just the moving part
+            pad_w = max(self.padding * max(w, h), (min_side - w) / 2, 0)
+            pad_h = max(self.padding * max(w, h), (min_side - h) / 2, 0)
+            left = max(0, int(x - pad_w))
+            top = max(0, int(y - pad_h))
+            right = min(width, int(x + w + pad_w) + 1)
+            bottom = min(height, int(y + h + pad_h) + 1)
+            regions.append((left, top, right - left, bottom - top))
+        return merge_regions(regions)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "partial": self.partial,
+            "skip_ratio": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+        }
+
+
+def overlaps(a, b):
+    return (
+        a[0] < b[0] + b[2]
+        and b[0] < a[0] + a[2]
+        and a[1] < b[1] + b[3]
+        and b[1] < a[1] + a[3]
+    )
+
+
+def merge_regions(regions):
+    # overlapping regions become their bounding box, so no area is searched twice
+    merged = []
+    for region in regions:
+        while True:
+            for other in merged:
+                if overlaps(region, other):
+                    merged.remove(other)
+                    left = min(region[0], other[0])
+                    top = min(region[1], other[1])
+                    right = max(region[0] + region[2], other[0] + other[2])
+                    bottom = max(region[1] + region[3], other[1] + other[3])
+                    region = (left, top, right - left, bottom - top)
+                    break
+            else:
+                break
+        merged.append(region)
+    return merged
@@ -0,0 +1,154 @@
+import json
+import math
+import threading
+import time
+
+
+class LatencyHistogram:
+    # Fixed-size log-spaced buckets: constant memory and O(1) record, with
+    # percentiles accurate to one bucket width (~12%).
+    def __init__(self, min_ms=0.01, max_ms=10000.0, growth=1.25):
+        self.min_ms = min_ms
+        self.log_growth = math.log(growth)
+        self.size = int(math.ceil(math.log(max_ms / min_ms) / self.log_growth)) + 1
+        self.growth = growth
+        self.counts = [0] * self.size
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, milliseconds):
+        if milliseconds <= self.min_ms:
+            index = 0
+        else:
+            index = min(
+                self.size - 1,
+                int(math.log(milliseconds / self.min_ms) / self.log_growth) + 1,
+            )
+        self.counts[index] += 1
+        self.count += 1
+        self.total_ms += milliseconds
+        self.max_ms = max(self.max_ms, milliseconds)
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0.0
+        target = percent / 100 * self.count
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= target:
+                return min(self.max_ms, self.min_ms * self.growth**index)
+        return self.max_ms
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class _Stage:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+
+class StageProfiler:
+    # Per-stage timings for the frame loop. Disabled by default; while
+    # disabled stage() returns a shared no-op context and nothing is recorded.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.frames = 0
+        self.fps = 0.0
+        self.last_frame = None
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        self.last_frame = None
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NO_STAGE
+        return _Stage(self, name)
+
+    def record(self, name, seconds):
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = LatencyHistogram()
+            histogram.record(seconds * 1000)
+
+    def frame_done(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        with self.lock:
+            if self.last_frame is not None:
+                interval = now - self.last_frame
+                if interval > 0:
+                    # smoothed so the overlay does not flicker
+                    self.fps = (
+                        0.9 * self.fps + 0.1 / interval if self.fps else 1 / interval
+                    )
+            self.last_frame = now
+            self.frames += 1
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.frames = 0
+            self.fps = 0.0
+            self.last_frame = None
+
+    def summary(self):
+        with self.lock:
+            return {
+                "frames": self.frames,
+                "fps": round(self.fps, 2),
+                "stages": {
+                    name: histogram.summary()
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+    def export_json(self, path=None):
+        text = json.dumps(self.summary(), indent=2)
+        if path is not None:
+            with open(path, "w") as output:
+                output.write(text)
+        return text
+
+    def overlay_text(self):
+        summary = self.summary()
+        lines = [f"{summary['fps']:.1f} FPS"]
+        for name, stage in summary["stages"].items():
+            lines.append(
+                f"{name}: {stage['p50_ms']:.1f} / {stage['p95_ms']:.1f} / {stage['p99_ms']:.1f} ms"
+            )
+        return "\n".join(lines)
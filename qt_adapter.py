@@ -0,0 +1,124 @@
+import threading
+import time
+import cv2
+import numpy as np
+from PySide6.QtGui import QImage
+
+
+def cv_to_qt_image(cv_image):
+    # wraps the array without copying; the caller keeps cv_image alive
+    height, width = cv_image.shape[:2]
+
+    if len(cv_image.shape) == 2:  # Grayscale image
+        bytes_per_line = width
+        q_image = QImage(
+            cv_image.data, width, height, bytes_per_line, QImage.Format_Grayscale8
+        )
+    elif len(cv_image.shape) == 3:  # RGB image
+        bytes_per_line = 3 * width
+        q_image = QImage(
+            cv_image.data, width, height, bytes_per_line, QImage.Format_BGR888
+        )
+    else:
+        raise ValueError("Unsupported image format")
+
+    return q_image
+
+
+class DisplayPipeline:
+    # Latest-value mailbox between the worker and the GUI. The worker resizes
+    # each annotated frame once, straight to the size of the display label,
+    # into one of three preallocated buffers (triple buffering): the worker
+    # only writes "back", the GUI only reads "front", and "ready" holds the
+    # newest finished frame. post() replaces an untaken frame instead of
+    # queueing it, so the GUI only ever sees the freshest frame and at most
+    # one frame event is pending at a time.
+    def __init__(self, width=1000, height=800, max_fps=30):
+        self.target_size = (width, height)
+        self.max_fps = max_fps
+        self.buffers = [None, None, None]
+        self.back, self.ready, self.front = 0, 1, 2
+        self.ready_count = None
+        self.ready_timestamp = None
+        # position in the source of the frame last taken, when it has one
+        self.timestamp_ms = None
+        self.lock = threading.Lock()
+        self.last_take = 0.0
+        self.posted = 0
+        self.taken = 0
+        self.replaced = 0
+        self.pending_signals = 0
+        self.max_pending_signals = 0
+
+    def set_target_size(self, width, height):
+        with self.lock:
+            self.target_size = (max(1, width), max(1, height))
+
+    def set_max_fps(self, max_fps):
+        self.max_fps = max_fps
+
+    def fit_size(self, width, height):
+        target_width, target_height = self.target_size
+        scale = min(target_width / width, target_height / height)
+        return max(1, int(width * scale)), max(1, int(height * scale))
+
+    def post(self, n, cv_image, timestamp_ms=None):
+        # returns True when the mailbox was empty, i.e. the GUI needs a signal
+        height, width = cv_image.shape[:2]
+        size = self.fit_size(width, height)
+        shape = (size[1], size[0]) + cv_image.shape[2:]
+        buffer = self.buffers[self.back]
+        if buffer is None or buffer.shape != shape:
+            buffer = self.buffers[self.back] = np.empty(shape, np.uint8)
+        interpolation = cv2.INTER_AREA if size[0] < width else cv2.INTER_LINEAR
+        cv2.resize(cv_image, size, dst=buffer, interpolation=interpolation)
+
+        with self.lock:
+            self.back, self.ready = self.ready, self.back
+            was_empty = self.ready_count is None
+            if was_empty:
+                self.pending_signals += 1
+                self.max_pending_signals = max(
+                    self.max_pending_signals, self.pending_signals
+                )
+            else:
+                self.replaced += 1
+            self.ready_count = n
+            self.ready_timestamp = timestamp_ms
+            self.posted += 1
+        return was_empty
+
+    def wait_time(self):
+        # seconds the GUI should wait before the next take to honour max_fps
+        if not self.max_fps:
+            return 0.0
+        return max(0.0, self.last_take + 1 / self.max_fps - time.perf_counter())
+
+    def take(self):
+        # GUI thread only; the QImage wraps the front buffer without copying
+        # and stays valid until the next take()
+        with self.lock:
+            self.pending_signals = max(0, self.pending_signals - 1)
+            if self.ready_count is None:
+                return None
+            self.ready, self.front = self.front, self.ready
+            n = self.ready_count
+            self.timestamp_ms = self.ready_timestamp
+            self.ready_count = None
+            self.taken += 1
+        self.last_take = time.perf_counter()
+        return n, cv_to_qt_image(self.buffers[self.front])
+
+    def reset(self):
+        with self.lock:
+            self.ready_count = None
+            self.pending_signals = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "posted": self.posted,
+                "displayed": self.taken,
+                "replaced": self.replaced,
+                "max_pending_signals": self.max_pending_signals,
+            }
@@ -0,0 +1,188 @@
+import json
+import os
+import queue
+import threading
+import time
+import cv2
+
+
+def to_json_boxes(model, results):
+    if model == "faces+eyes":
+        return [[list(face), [list(eye) for eye in eyes]] for face, eyes in results]
+    return [list(box) for box in results]
+
+
+class Recorder(threading.Thread):
+    # Writes annotated frames to a video file and their boxes to a JSONL
+    # sidecar, one line per frame. record() only copies the frame into a
+    # bounded queue: when the encoder or the disk falls behind, frames are
+    # dropped and counted instead of slowing down the detection loop. Output
+    # is split into numbered segments by size and/or duration.
+    def __init__(
+        self,
+        prefix,
+        fps=30.0,
+        fourcc="mp4v",
+        extension=".mp4",
+        queue_size=32,
+        max_bytes=None,
+        max_seconds=None,
+    ):
+        super().__init__(daemon=True)
+        self.prefix = prefix
+        self.fps = fps
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.extension = extension
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.writer = None
+        self.sidecar = None
+        self.segment = 0
+        self.segment_path = None
+        self.segment_size = None
+        self.segment_start = 0.0
+        self.segment_frames = 0
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.error = None
+
+    def record(self, cv_image, model, results, index=None, timestamp_ms=None):
+        # never blocks; returns False when the frame had to be dropped
+        if self.stop_event.is_set():
+            return False
+        with self.lock:
+            self.submitted += 1
+        # a stalled encoder must not cost a full copy for every dropped frame;
+        # with one producer the queue can only get emptier after this check
+        if self.frames.full():
+            return self.drop()
+        entry = {
+            "time": time.time(),
+            "index": index,
+            "timestamp_ms": timestamp_ms,
+            "model": model,
+            "count": len(results),
+            "boxes": to_json_boxes(model, results),
+        }
+        try:
+            self.frames.put_nowait((cv_image.copy(), entry))
+        except queue.Full:
+            return self.drop()
+        return True
+
+    def drop(self):
+        with self.lock:
+            self.dropped += 1
+        return False
+
+    def run(self):
+        while True:
+            try:
+                cv_image, entry = self.frames.get(timeout=0.1)
+            except queue.Empty:
+                if self.stop_event.is_set():
+                    break
+                continue
+            try:
+                self.write(cv_image, entry)
+            except OSError as error:
+                # the output cannot be opened: retrying on every frame would
+                # only repeat the failure, so the recording ends here
+                with self.lock:
+                    self.errors += 1
+                    self.error = str(error)
+                print(f"Warning: Recording stopped: {error}")
+                self.stop_event.set()
+                self.discard()
+                break
+            except Exception as error:
+                with self.lock:
+                    self.errors += 1
+                print(f"Warning: Could not record frame: {error}")
+        self.close_segment()
+
+    def write(self, cv_image, entry):
+        if len(cv_image.shape) == 2:
+            cv_image = cv2.cvtColor(cv_image, cv2.COLOR_GRAY2BGR)
+        size = (cv_image.shape[1], cv_image.shape[0])
+        if self.writer is None or size != self.segment_size or self.segment_full():
+            self.open_segment(size)
+        self.writer.write(cv_image)
+        entry["segment_frame"] = self.segment_frames
+        self.sidecar.write(json.dumps(entry) + "\n")
+        self.segment_frames += 1
+        with self.lock:
+            self.written += 1
+
+    def segment_full(self):
+        if (
+            self.max_seconds
+            and time.monotonic() - self.segment_start >= self.max_seconds
+        ):
+            return True
+        if self.max_bytes and os.path.exists(self.segment_path):
+            return os.path.getsize(self.segment_path) >= self.max_bytes
+        return False
+
+    def open_segment(self, size):
+        self.close_segment()
+        base = f"{self.prefix}_{self.segment + 1:03d}"
+        path = base + self.extension
+        writer = cv2.VideoWriter(path, self.fourcc, self.fps, size)
+        if not writer.isOpened():
+            writer.release()
+            raise OSError(f"Could not open {path} for writing")
+        try:
+            self.sidecar = open(base + ".jsonl", "w")
+        except OSError:
+            writer.release()
+            raise
+        # numbered only once both files are open
+        self.segment += 1
+        self.segment_path = path
+        self.writer = writer
+        self.segment_size = size
+        self.segment_start = time.monotonic()
+        self.segment_frames = 0
+
+    def close_segment(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+        if self.sidecar is not None:
+            self.sidecar.close()
+            self.sidecar = None
+
+    def discard(self):
+        while True:
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                return
+            with self.lock:
+                self.dropped += 1
+
+    def stop(self, wait=False):
+        # frames already queued are still written, in the background unless
+        # wait is set: the GUI never waits for a stalled disk
+        self.stop_event.set()
+        if wait:
+            self.join(timeout=10)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "submitted": self.submitted,
+                "written": self.written,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "queued": self.frames.qsize(),
+                "segments": self.segment,
+                "segment_path": self.segment_path,
+                "error": self.error,
+            }
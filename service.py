@@ -0,0 +1,433 @@
+# Local detection service: other processes on this machine post images and
+# get boxes back as JSON, without loading the cascades themselves. Never
+# imports PySide6. Listens on localhost or on a Unix socket:
+#   python service.py --port 8765 --workers 4
+#   python service.py --unix /tmp/face_eyes.sock
+#
+#   POST /detect   an encoded image (JPEG, PNG, ...) as the body, or a raw
+#                  8-bit frame with ?width=W&height=H[&channels=3] (BGR);
+#                  optional model, scale_factor, min_neighbors, max_width,
+#                  min_size, max_size and equalization query parameters
+#   GET  /health   200 while the workers are alive, 503 otherwise
+#   GET  /metrics  request, batch and latency counters
+import argparse
+import http.client
+import json
+import os
+import queue
+import signal
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+import cv2
+import numpy as np
+from detection import MODELS, scale_results
+from detection_pool import ProcessPoolDetectionExecutor
+from image_processing import ImageProcessing
+from profiling import LatencyHistogram
+
+
+EQUALIZATIONS = ("none", "hist", "clahe")
+
+
+class MicroBatcher(threading.Thread):
+    # Collects the requests that arrive within window_ms of each other (up
+    # to max_batch) and hands them to the worker pool together, one message
+    # per worker. A lone request only waits for the window.
+    def __init__(self, executor, window_ms=2.0, max_batch=16):
+        super().__init__(daemon=True)
+        self.executor = executor
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.batched = 0
+        self.largest = 0
+
+    def submit(self, image, params):
+        future = Future()
+        self.requests.put((image, params, future))
+        return future
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            batch = [request]
+            deadline = time.perf_counter() + self.window_ms / 1000
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    request = (
+                        self.requests.get(timeout=remaining)
+                        if remaining > 0
+                        else self.requests.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)
+                    break
+                batch.append(request)
+            self.dispatch(batch)
+
+    def dispatch(self, batch):
+        with self.lock:
+            self.batches += 1
+            self.batched += len(batch)
+            self.largest = max(self.largest, len(batch))
+        try:
+            futures = self.executor.submit_batch(
+                [(image, params) for image, params, _ in batch]
+            )
+        except Exception as error:
+            for _, _, future in batch:
+                future.set_exception(error)
+            return
+        for inner, (_, _, future) in zip(futures, batch):
+            inner.add_done_callback(lambda inner, future=future: forward(inner, future))
+
+    def stop(self):
+        self.requests.put(None)
+        self.join(timeout=2)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "mean_batch": (
+                    round(self.batched / self.batches, 2) if self.batches else 0.0
+                ),
+                "largest_batch": self.largest,
+                "queued": self.requests.qsize(),
+            }
+
+
+def forward(inner, future):
+    error = inner.exception()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(inner.result())
+
+
+def decode_image(body, query):
+    # raw frames carry their size in the query, anything else is decoded
+    if "width" in query or "height" in query:
+        width = int(query.get("width", 0))
+        height = int(query.get("height", 0))
+        channels = int(query.get("channels", 1))
+        if width <= 0 or height <= 0:
+            raise ValueError(f"Raw frame size {width}x{height} is empty")
+        if channels not in (1, 3) or len(body) != width * height * channels:
+            raise ValueError(
+                f"Raw frame is {len(body)} bytes, expected {width}x{height}x{channels}"
+            )
+        shape = (height, width) if channels == 1 else (height, width, 3)
+        return np.frombuffer(body, np.uint8).reshape(shape)
+    # gray images stay single-channel, everything else becomes 8-bit BGR
+    image = cv2.imdecode(np.frombuffer(body, np.uint8), cv2.IMREAD_ANYCOLOR)
+    if image is None:
+        raise ValueError("Could not decode image")
+    return image
+
+
+def size_option(value):
+    if value is None:
+        return None
+    size = int(value)
+    if size < 0:
+        raise ValueError(f"Object size {size} is negative")
+    return (size, size) if size > 0 else None
+
+
+class DetectionService:
+    # Decoding and downscaling happen on the request threads; the cascades
+    # only run in the warm worker processes, reached through the batcher.
+    def __init__(self, batcher, processes, defaults, timeout=30.0):
+        self.batcher = batcher
+        self.processes = processes
+        self.defaults = defaults
+        self.timeout = timeout
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency = LatencyHistogram()
+        self.detect_latency = LatencyHistogram()
+
+    def image_processing(self, query):
+        options = {**self.defaults, **query}
+        if options["model"] not in MODELS:
+            raise ValueError(f"Unknown model {options['model']}")
+        if options["equalization"] not in EQUALIZATIONS:
+            raise ValueError(f"Unknown equalization {options['equalization']}")
+        # the cascades assert on these, which would fail the whole batch
+        scale_factor = float(options["scale_factor"])
+        if not scale_factor > 1:
+            raise ValueError(f"scale_factor must be above 1, got {scale_factor}")
+        min_neighbors = int(options["min_neighbors"])
+        if min_neighbors < 0:
+            raise ValueError(f"min_neighbors must not be negative, got {min_neighbors}")
+        max_width = int(options["max_width"] or 0)
+        if max_width < 0:
+            raise ValueError(f"max_width must not be negative, got {max_width}")
+        image_processing = ImageProcessing()
+        image_processing.set_model(options["model"])
+        image_processing.set_scale_factor(scale_factor)
+        image_processing.set_min_neighbors(min_neighbors)
+        image_processing.set_detection_max_width(max_width or None)
+        image_processing.set_min_size(size_option(options.get("min_size")))
+        image_processing.set_max_size(size_option(options.get("max_size")))
+        image_processing.set_equalization(options["equalization"])
+        return image_processing
+
+    def detect(self, body, query):
+        start = time.perf_counter()
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+        try:
+            image_processing = self.image_processing(query)
+            image = decode_image(body, query)
+            small, ratio, offset = image_processing.detection_input(image)
+            model = image_processing.model
+            # the request owns its buffers, so the batcher can keep a view
+            future = self.batcher.submit(
+                small, image_processing.cascade_params(model, ratio)
+            )
+            detect_start = time.perf_counter()
+            # a lost worker must not hang the request thread
+            boxes = future.result(timeout=self.timeout)
+            results = scale_results(boxes, ratio, model, offset)
+        except Exception:
+            with self.lock:
+                self.errors += 1
+            raise
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        with self.lock:
+            now = time.perf_counter()
+            self.latency.record((now - start) * 1000)
+            self.detect_latency.record((now - detect_start) * 1000)
+        return {
+            "model": model,
+            "width": image.shape[1],
+            "height": image.shape[0],
+            "count": len(results),
+            "boxes": results,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+
+    def alive_workers(self):
+        return sum(process.is_alive() for process in self.processes)
+
+    def health(self):
+        alive = self.alive_workers()
+        return {
+            "status": "ok" if alive else "down",
+            "workers": alive,
+            "uptime_s": round(time.time() - self.started, 1),
+        }
+
+    def metrics(self):
+        with self.lock:
+            metrics = {
+                "requests": self.requests,
+                "errors": self.errors,
+                "in_flight": self.in_flight,
+                "latency": self.latency.summary(),
+                "queue_and_detect": self.detect_latency.summary(),
+            }
+        metrics["workers"] = self.alive_workers()
+        metrics["batching"] = self.batcher.stats()
+        return metrics
+
+
+class DetectionRequestHandler(BaseHTTPRequestHandler):
+    # keep-alive, so a client can send many frames over one connection
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        service = self.server.service
+        if path == "/health":
+            health = service.health()
+            self.send_json(200 if health["workers"] else 503, health)
+        elif path == "/metrics":
+            self.send_json(200, service.metrics())
+        else:
+            self.send_json(404, {"error": f"Unknown path {path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length)
+        if url.path != "/detect":
+            self.send_json(404, {"error": f"Unknown path {url.path}"})
+            return
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            result = self.server.service.detect(body, query)
+        except (ValueError, cv2.error) as error:
+            self.send_json(400, {"error": str(error)})
+            return
+        except FutureTimeout:
+            self.send_json(504, {"error": "Detection timed out"})
+            return
+        except RuntimeError as error:
+            self.send_json(503, {"error": str(error)})
+            return
+        self.send_json(200, result)
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return str(self.client_address[0]) if self.client_address else "local"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=30):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class DetectionClient:
+    # One keep-alive connection to the service; use one client per thread.
+    # address is "host:port" or the path of a Unix socket.
+    def __init__(self, address, timeout=30):
+        if os.sep in address or not address.rpartition(":")[2].isdigit():
+            self.connection = UnixHTTPConnection(address, timeout)
+        else:
+            host, _, port = address.rpartition(":")
+            self.connection = http.client.HTTPConnection(
+                host, int(port), timeout=timeout
+            )
+
+    def request(self, method, path, body=None):
+        self.connection.request(method, path, body)
+        response = self.connection.getresponse()
+        payload = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(f"{response.status}: {payload.get('error', payload)}")
+        return payload
+
+    def detect(self, image, **options):
+        # image is encoded bytes, or a uint8 array sent as a raw frame
+        if isinstance(image, np.ndarray):
+            options["height"], options["width"] = image.shape[:2]
+            options["channels"] = 1 if len(image.shape) == 2 else image.shape[2]
+            image = np.ascontiguousarray(image).tobytes()
+        query = urlencode(options)
+        return self.request("POST", "/detect" + (f"?{query}" if query else ""), image)
+
+    def health(self):
+        return self.request("GET", "/health")
+
+    def metrics(self):
+        return self.request("GET", "/metrics")
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local face/eye detection service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument(
+        "--workers", type=int, default=0, help="0 = one per core but one"
+    )
+    parser.add_argument(
+        "--batch-window-ms",
+        type=float,
+        default=2.0,
+        help="how long a request waits for others to share its batch",
+    )
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=30.0,
+        help="seconds a request waits for detection",
+    )
+    parser.add_argument("--model", choices=MODELS, default="faces")
+    parser.add_argument("--scale-factor", type=float, default=1.1)
+    parser.add_argument("--min-neighbors", type=int, default=5)
+    parser.add_argument("--max-width", type=int, default=0)
+    parser.add_argument("--equalization", choices=EQUALIZATIONS, default="none")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args()
+
+    # workers load the cascades now, not on the first request
+    executor = ProcessPoolDetectionExecutor(workers=args.workers or None)
+    batcher = MicroBatcher(executor, args.batch_window_ms, args.max_batch)
+    batcher.start()
+    defaults = {
+        "model": args.model,
+        "scale_factor": args.scale_factor,
+        "min_neighbors": args.min_neighbors,
+        "max_width": args.max_width,
+        "equalization": args.equalization,
+    }
+    service = DetectionService(batcher, executor.processes, defaults, args.timeout)
+
+    if args.unix:
+        if os.path.exists(args.unix):
+            os.unlink(args.unix)
+        server = ThreadingUnixHTTPServer(args.unix, DetectionRequestHandler)
+        address = args.unix
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), DetectionRequestHandler)
+        address = f"{args.host}:{server.server_address[1]}"
+    server.service = service
+    server.verbose = args.verbose
+    print(
+        f"Serving detection on {address} with {len(executor.processes)} workers",
+        flush=True,
+    )
+    # a plain kill shuts down like Ctrl+C, so the workers do not outlive us
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.stop()
+        executor.close()
+        if args.unix and os.path.exists(args.unix):
+            os.unlink(args.unix)
+
+
+if __name__ == "__main__":
+    main()
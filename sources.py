@@ -0,0 +1,296 @@
+# Several capture sources processed side by side, each with its own
+# capture/detect pipeline and all sharing one optional detection pool.
+# Video files and image sequences can stand in for cameras:
+#   python sources.py cam_a.mp4 cam_b.mp4 "frames/*.png" --workers 3 --seconds 20
+import argparse
+import glob
+import os
+import threading
+import time
+import cv2
+from autotune import LatencyAutoTuner
+from capture import FrameRingBuffer, CaptureThread
+from detection import MODELS
+from image_processing import ImageProcessing
+
+
+SETTINGS = (
+    "model",
+    "image_color",
+    "detection_scale",
+    "max_size",
+    "equalization",
+    "rois",
+)
+# owned by a source's own auto-tuner while auto-tuning is on
+TUNED = ("scale_factor", "min_neighbors", "detection_max_width", "min_size")
+
+
+class ImageSequenceCapture:
+    # VideoCapture-like reader over a sorted list of image files
+    def __init__(self, paths, fps=10, loop=True):
+        self.paths = paths
+        self.interval = 1 / fps if fps else 0
+        self.loop = loop
+        self.index = 0
+        self.next_time = 0.0
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def read(self):
+        if self.index >= len(self.paths):
+            if not self.loop or not self.paths:
+                return False, None
+            self.index = 0
+        delay = self.next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_time = time.perf_counter() + self.interval
+        frame = cv2.imread(self.paths[self.index])
+        self.index += 1
+        return frame is not None, frame
+
+    def release(self):
+        self.paths = []
+
+
+class PacedVideoCapture:
+    # Plays a video file at its own frame rate, looping at the end, so that
+    # a recording behaves like a live camera
+    def __init__(self, path, loop=True):
+        self.capture = cv2.VideoCapture(path)
+        fps = self.capture.get(cv2.CAP_PROP_FPS) or 30
+        self.interval = 1 / fps
+        self.loop = loop
+        self.next_time = 0.0
+
+    def read(self):
+        delay = self.next_time - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_time = max(self.next_time + self.interval, time.perf_counter())
+        ok, frame = self.capture.read()
+        if not ok and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ok, frame = self.capture.read()
+        return ok, frame
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def release(self):
+        self.capture.release()
+
+
+def open_source(spec):
+    if isinstance(spec, int) or str(spec).isdigit():
+        return cv2.VideoCapture(int(spec))
+    if os.path.isdir(spec):
+        paths = sorted(
+            os.path.join(spec, name)
+            for name in os.listdir(spec)
+            if os.path.splitext(name)[1].lower() in (".png", ".jpg", ".jpeg", ".bmp")
+        )
+        return ImageSequenceCapture(paths)
+    if any(char in spec for char in "*?["):
+        return ImageSequenceCapture(sorted(glob.glob(spec)))
+    return PacedVideoCapture(spec)
+
+
+class SourcePipeline(threading.Thread):
+    def __init__(
+        self, name, spec, executor=None, settings=None, on_frame=None, on_count=None
+    ):
+        super().__init__(daemon=True)
+        self.name = name
+        self.spec = spec
+        self.image_processing = ImageProcessing()
+        self.image_processing.set_source(str(spec))
+        if executor is not None:
+            self.image_processing.set_executor(executor)
+        # settings are copied from this ImageProcessing before every frame
+        self.settings = settings
+        self.on_frame = on_frame
+        self.on_count = on_count
+        self.frame_buffer = FrameRingBuffer(capacity=2)
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.count = 0
+        self.frames = 0
+        self.fps = 0.0
+        self.window_start = time.perf_counter()
+        self.window_frames = 0
+
+    def sync_settings(self):
+        if self.settings is None:
+            return
+        # each source tunes itself: sources differ in size and cost, and a
+        # shared tuner would keep resetting and write to the GUI's settings
+        autotuner = self.settings.autotuner
+        if autotuner is None:
+            if self.image_processing.autotuner is not None:
+                self.image_processing.set_autotuner(None)
+        elif self.image_processing.autotuner is None:
+            self.image_processing.set_autotuner(
+                LatencyAutoTuner(self.image_processing, autotuner.target_ms)
+            )
+        elif self.image_processing.autotuner.target_ms != autotuner.target_ms:
+            self.image_processing.autotuner.set_target_ms(autotuner.target_ms)
+        tuning = self.image_processing.autotuner is not None
+        for name in SETTINGS:
+            setattr(self.image_processing, name, getattr(self.settings, name))
+        if not tuning:
+            for name in TUNED:
+                setattr(self.image_processing, name, getattr(self.settings, name))
+        motion_gate = self.settings.motion_gate
+        if motion_gate is None:
+            self.image_processing.motion_gate = None
+        elif self.image_processing.motion_gate is None:
+            self.image_processing.set_motion_gate(motion_gate.copy())
+
+    def publish(self, count, cv_image):
+        now = time.perf_counter()
+        with self.lock:
+            # frames per one-second window; the pool can finish several at once
+            self.window_frames += 1
+            if now - self.window_start >= 1.0:
+                self.fps = self.window_frames / (now - self.window_start)
+                self.window_start = now
+                self.window_frames = 0
+            self.count = count
+            self.frames += 1
+        if self.on_count is not None:
+            self.on_count()
+        if self.on_frame is not None:
+            self.on_frame(self.name, count, cv_image)
+
+    def run(self):
+        capture = open_source(self.spec)
+        if not capture.isOpened():
+            print(f"Warning: Could not open source {self.spec}.")
+            capture.release()
+            return
+        capture_thread = CaptureThread(capture, self.frame_buffer)
+        capture_thread.start()
+        while not self.stop_event.is_set():
+            _, frame = self.frame_buffer.get_latest(timeout=0.1)
+            if frame is None:
+                # while the source stalls, frames the pool finished still go out
+                if self.image_processing.executor is not None:
+                    self.publish_finished()
+                continue
+            self.sync_settings()
+            if self.image_processing.executor is None:
+                self.publish(*self.image_processing.process_image(frame))
+                continue
+            self.image_processing.submit_frame(frame)
+            self.publish_finished()
+
+        capture_thread.stop()
+        capture.release()
+        self.image_processing.flush()
+
+    def publish_finished(self):
+        for count, cv_image in self.image_processing.finished_frames():
+            self.publish(count, cv_image)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join(timeout=2)
+
+    def stats(self):
+        with self.lock:
+            stats = {
+                "count": self.count,
+                "frames": self.frames,
+                "fps": round(self.fps, 2),
+            }
+        stats.update(self.frame_buffer.stats())
+        if self.image_processing.motion_gate is not None:
+            stats["skip_ratio"] = self.image_processing.motion_gate.stats()[
+                "skip_ratio"
+            ]
+        return stats
+
+
+class SourceManager:
+    # telemetry: an optional TelemetryWriter that gets the count summed over
+    # all sources whenever one of them publishes a frame
+    def __init__(self, specs, workers=0, settings=None, on_frame=None, telemetry=None):
+        self.settings = settings
+        self.telemetry = telemetry
+        self.executor = None
+        if workers:
+            from detection_pool import ProcessPoolDetectionExecutor
+
+            self.executor = ProcessPoolDetectionExecutor(workers=workers)
+        on_count = self.publish_count if telemetry is not None else None
+        self.pipelines = [
+            SourcePipeline(
+                f"source {index}", spec, self.executor, settings, on_frame, on_count
+            )
+            for index, spec in enumerate(specs)
+        ]
+        for pipeline in self.pipelines:
+            # the pool is shared, so each source gets its part of the workers
+            pipeline.image_processing.pool_workers = max(1, workers) / len(
+                self.pipelines
+            )
+
+    def start(self):
+        for pipeline in self.pipelines:
+            pipeline.start()
+
+    def stop(self):
+        for pipeline in self.pipelines:
+            pipeline.stop()
+        if self.executor is not None:
+            self.executor.close()
+            self.executor = None
+
+    def stats(self):
+        return {
+            pipeline.name: {"spec": str(pipeline.spec), **pipeline.stats()}
+            for pipeline in self.pipelines
+        }
+
+    def total_count(self):
+        return sum(pipeline.count for pipeline in self.pipelines)
+
+    def publish_count(self):
+        # publish() only swaps the pending value, so every frame may call it
+        model = self.settings.model if self.settings is not None else "faces"
+        self.telemetry.publish(model, self.total_count())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run detection on several sources")
+    parser.add_argument(
+        "sources", nargs="+", help="device indices, videos or image globs"
+    )
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--model", choices=MODELS, default="faces")
+    parser.add_argument("--scale-factor", type=float, default=1.5)
+    parser.add_argument("--max-width", type=int, default=None)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    settings = ImageProcessing()
+    settings.set_model(args.model)
+    settings.set_scale_factor(args.scale_factor)
+    settings.set_detection_max_width(args.max_width)
+    manager = SourceManager(args.sources, workers=args.workers, settings=settings)
+    manager.start()
+    try:
+        deadline = time.perf_counter() + args.seconds
+        while time.perf_counter() < deadline:
+            time.sleep(1)
+            for name, stats in manager.stats().items():
+                print(f"{name}: {stats['count']} {args.model}, {stats['fps']:.1f} FPS")
+    finally:
+        manager.stop()
+
+
+if __name__ == "__main__":
+    main()
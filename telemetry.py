@@ -0,0 +1,198 @@
+import socket
+import struct
+import threading
+import time
+
+
+MODEL_CODES = {"faces": 1, "eyes": 2, "faces+eyes": 3}
+
+
+def encode_text(model, count):
+    return f"N {model}: {count}".encode()
+
+
+def encode_binary(model, count):
+    # 0xAA 0x55 | model code | count (uint16 little endian) | checksum
+    payload = struct.pack("<BH", MODEL_CODES.get(model, 0), min(count, 0xFFFF))
+    return b"\xaa\x55" + payload + bytes([sum(payload) & 0xFF])
+
+
+FRAMINGS = {"text": encode_text, "binary": encode_binary}
+
+
+class SerialSink:
+    kind = "serial"
+
+    def __init__(self, port, baudrate=57600, write_timeout=1.0):
+        self.port = port
+        self.baudrate = baudrate
+        self.write_timeout = write_timeout
+        self.connection = None
+
+    def open(self):
+        import serial
+
+        self.connection = serial.Serial(
+            self.port, self.baudrate, write_timeout=self.write_timeout
+        )
+
+    def write(self, data):
+        self.connection.write(data)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __str__(self):
+        return f"serial {self.port} @ {self.baudrate}"
+
+
+class UdpSink:
+    kind = "udp"
+
+    def __init__(self, host, port):
+        self.address = (host, port)
+        self.connection = None
+
+    def open(self):
+        self.connection = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def write(self, data):
+        self.connection.sendto(data, self.address)
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __str__(self):
+        return f"udp {self.address[0]}:{self.address[1]}"
+
+
+class FileSink:
+    kind = "file"
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+
+    def open(self):
+        self.connection = open(self.path, "ab")
+
+    def write(self, data):
+        self.connection.write(data + b"\n")
+        self.connection.flush()
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __str__(self):
+        return f"file {self.path}"
+
+
+def open_sink(spec):
+    # "serial:COM10@57600", "udp:127.0.0.1:9000" or "file:counts.log"
+    kind, _, target = spec.partition(":")
+    if kind == "serial":
+        port, _, baudrate = target.partition("@")
+        return SerialSink(port, int(baudrate or 57600))
+    elif kind == "udp":
+        host, _, port = target.rpartition(":")
+        return UdpSink(host or "127.0.0.1", int(port))
+    elif kind == "file":
+        return FileSink(target)
+    raise ValueError(f"Unsupported telemetry sink {spec}")
+
+
+class TelemetryWriter(threading.Thread):
+    # Sends the latest count to a sink from its own thread. publish() never
+    # blocks: it only replaces the pending value, so a slow or stalled sink
+    # coalesces updates instead of queueing them. A failed open or write
+    # closes the sink and retries with exponential backoff.
+    def __init__(self, sink, framing="text", interval=1.5, max_backoff=30.0):
+        super().__init__(daemon=True)
+        self.sink = sink
+        self.encode = FRAMINGS[framing]
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.latest = None
+        self.pending_sink = None
+        self.connected = False
+        self.backoff = 0.5
+        self.next_attempt = 0.0
+        self.status = "disconnected"
+        self.sent = 0
+        self.failures = 0
+
+    def publish(self, model, count):
+        with self.lock:
+            self.latest = (model, count)
+
+    def set_framing(self, framing):
+        self.encode = FRAMINGS[framing]
+
+    def set_sink(self, sink):
+        # applied by the writer thread on its next tick
+        with self.lock:
+            self.pending_sink = sink
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            with self.lock:
+                latest = self.latest
+                new_sink = self.pending_sink
+                self.pending_sink = None
+            if new_sink is not None:
+                self.disconnect("switching sink")
+                self.sink = new_sink
+                self.backoff = 0.5
+                self.next_attempt = 0.0
+            if latest is None:
+                continue
+            if not self.connected and not self.connect():
+                continue
+            try:
+                self.sink.write(self.encode(*latest))
+                self.sent += 1
+            except Exception as error:
+                self.failures += 1
+                self.disconnect(f"write failed: {error}")
+                self.schedule_retry()
+        self.disconnect("stopped")
+
+    def connect(self):
+        if time.monotonic() < self.next_attempt:
+            return False
+        try:
+            self.sink.open()
+        except Exception as error:
+            self.failures += 1
+            self.status = f"cannot open {self.sink}: {error}"
+            self.schedule_retry()
+            return False
+        self.connected = True
+        self.backoff = 0.5
+        self.status = f"connected to {self.sink}"
+        return True
+
+    def disconnect(self, reason):
+        try:
+            self.sink.close()
+        except Exception:
+            pass
+        if self.connected:
+            self.status = f"disconnected: {reason}"
+        self.connected = False
+
+    def schedule_retry(self):
+        self.next_attempt = time.monotonic() + self.backoff
+        self.backoff = min(self.backoff * 2, self.max_backoff)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join(timeout=2)
@@ -0,0 +1,197 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import cv2
+from detection import (
+    FACE_CASCADE_PATH,
+    EYE_CASCADE_PATH,
+    detect_boxes,
+    load_cascade,
+    roi_box,
+    scale_results,
+    suppress_duplicates,
+)
+from motion import merge_regions
+
+
+REDUCED_FLAGS = {
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+def search(image, params):
+    # runs on a pool thread; the cascades are loaded once per thread and
+    # detectMultiScale releases the GIL, so tiles really run in parallel
+    return detect_boxes(
+        load_cascade(FACE_CASCADE_PATH), load_cascade(EYE_CASCADE_PATH), image, *params
+    )
+
+
+def tile_spans(length, tile, overlap):
+    # (start, size) of the fewest tiles of at most tile that cover length,
+    # each overlapping the next by overlap and no more
+    if length <= tile:
+        return [(0, length)]
+    count = -(-(length - overlap) // (tile - overlap))
+    size = -(-(length + (count - 1) * overlap) // count)
+    starts = [min(i * (size - overlap), length - size) for i in range(count)]
+    return [(start, size) for start in starts]
+
+
+class TiledDetector:
+    # Detection for large stills. The detection input is cut into tiles that
+    # overlap by the largest face searched for, so every face up to that size
+    # lies whole inside some tile, and the tiles are searched in parallel.
+    # Faces seen by two tiles are merged by non-maximum suppression, and
+    # faces larger than the overlap are searched on a downscaled copy of the
+    # whole image. With reduce (2, 4 or 8), a pass at 1/reduce resolution
+    # first finds candidates and only the areas around them are searched at
+    # full resolution; faces smaller than about 24 * reduce pixels are then
+    # missed.
+    def __init__(
+        self,
+        min_pixels=4_000_000,
+        tile_size=2048,
+        max_face=0.1,
+        coarse_width=1024,
+        reduce=None,
+        candidate_neighbors=2,
+        padding=0.5,
+        workers=None,
+    ):
+        if reduce is not None and reduce not in REDUCED_FLAGS:
+            raise ValueError(f"reduce must be one of {sorted(REDUCED_FLAGS)}")
+        self.min_pixels = min_pixels
+        self.tile_size = tile_size
+        self.max_face = max_face
+        self.coarse_width = coarse_width
+        self.reduce = reduce
+        self.candidate_neighbors = candidate_neighbors
+        self.padding = padding
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+
+    def applies(self, image):
+        return image.shape[0] * image.shape[1] >= self.min_pixels
+
+    def read_reduced(self, path):
+        # JPEG decodes straight to the smaller size, much faster than a full decode
+        if self.reduce is None:
+            return None
+        return cv2.imread(path, REDUCED_FLAGS[self.reduce])
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def run(self, jobs):
+        # (image, params) pairs, searched in parallel; results in job order
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="tile")
+        futures = [self.pool.submit(search, image, params) for image, params in jobs]
+        return [future.result() for future in futures]
+
+    def detect(self, image_processing, small, model, ratio, reduced=None):
+        # boxes in small's coordinates, like ImageProcessing.run_cascades;
+        # reduced is an optional gray copy of the whole frame, e.g. from
+        # read_reduced(), for the candidate pass
+        params = image_processing.cascade_params(model, ratio)
+        coarse = None
+        if self.reduce is not None:
+            regions = self.candidate_regions(image_processing, small, params, reduced)
+            jobs = [(small[y : y + h, x : x + w], params) for x, y, w, h in regions]
+        else:
+            overlap = int(self.max_face * min(small.shape[:2]))
+            if params[4]:
+                overlap = min(overlap, max(params[4]))
+            regions, jobs = self.tile_jobs(small, params, overlap)
+            coarse = self.coarse_job(small, params, overlap)
+            if coarse is not None:
+                jobs.append(coarse[1])
+
+        found = self.run(jobs)
+        results = []
+        for (x, y, _, _), boxes in zip(regions, found):
+            results += scale_results(boxes, 1.0, model, (x, y))
+        if coarse is not None:
+            results += scale_results(found[-1], coarse[0], model)
+        return suppress_duplicates(results, model)
+
+    def tile_jobs(self, small, params, overlap):
+        model, scale_factor, min_neighbors, min_size, _ = params
+        height, width = small.shape[:2]
+        tile = max(self.tile_size, 2 * overlap)
+        # a tile only looks for faces that fit in the overlap
+        tile_params = (model, scale_factor, min_neighbors, min_size, (overlap, overlap))
+        regions = []
+        jobs = []
+        for y, h in tile_spans(height, tile, overlap):
+            for x, w in tile_spans(width, tile, overlap):
+                regions.append((x, y, w, h))
+                jobs.append((small[y : y + h, x : x + w], tile_params))
+        return regions, jobs
+
+    def coarse_job(self, small, params, overlap):
+        # faces larger than the overlap, on a downscaled copy; returns the
+        # copy's ratio and its job, or None when no face can be that large
+        model, scale_factor, min_neighbors, _, max_size = params
+        if max_size and max(max_size) <= overlap:
+            return None
+        height, width = small.shape[:2]
+        ratio = min(1.0, self.coarse_width / width)
+        size = (max(1, round(width * ratio)), max(1, round(height * ratio)))
+        coarse = cv2.resize(small, size, interpolation=cv2.INTER_AREA)
+        scaled_max = None
+        if max_size:
+            scaled_max = tuple(max(1, int(v * ratio)) for v in max_size)
+        minimum = max(1, int(overlap * ratio))
+        coarse_params = (
+            model,
+            scale_factor,
+            min_neighbors,
+            (minimum, minimum),
+            scaled_max,
+        )
+        return ratio, (coarse, coarse_params)
+
+    def candidate_regions(self, image_processing, small, params, reduced):
+        model, scale_factor, min_neighbors, min_size, max_size = params
+        height, width = small.shape[:2]
+        if reduced is not None:
+            # the reduced decode covers the whole frame; keep the same ROI
+            roi = image_processing.roi
+            if roi is not None:
+                x, y, w, h = roi_box(roi, reduced.shape[1], reduced.shape[0])
+                reduced = reduced[y : y + h, x : x + w]
+        else:
+            size = (max(1, width // self.reduce), max(1, height // self.reduce))
+            reduced = cv2.resize(small, size, interpolation=cv2.INTER_AREA)
+        scale_x = width / reduced.shape[1]
+        scale_y = height / reduced.shape[0]
+
+        def shrink(size):
+            if not size:
+                return None
+            return (max(1, int(size[0] / scale_x)), max(1, int(size[1] / scale_y)))
+
+        # lenient on purpose: a false candidate only costs a small search
+        candidate_params = (
+            "eyes" if model == "eyes" else "faces",
+            scale_factor,
+            min(min_neighbors, self.candidate_neighbors),
+            shrink(min_size),
+            shrink(max_size),
+        )
+        (candidates,) = self.run([(reduced, candidate_params)])
+        regions = []
+        for x, y, w, h in candidates:
+            x, y, w, h = x * scale_x, y * scale_y, w * scale_x, h * scale_y
+            pad = self.padding * max(w, h)
+            left = max(0, int(x - pad))
+            top = max(0, int(y - pad))
+            right = min(width, int(x + w + pad) + 1)
+            bottom = min(height, int(y + h + pad) + 1)
+            regions.append((left, top, right - left, bottom - top))
+        return merge_regions(regions)
@@ -0,0 +1,37 @@
+# A pseudo-terminal that stands in for the serial device, for trying the
+# telemetry link without hardware (Linux/macOS only). Start it, then point
+# the app at the printed path:
+#   python tools/fake_serial_device.py
+#   python main.py --telemetry serial:/dev/pts/5@57600
+# --stall makes the "device" stop reading, to exercise write timeouts.
+import argparse
+import os
+import pty
+import time
+import tty
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stall", action="store_true", help="never read from the port")
+    args = parser.parse_args()
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    print(f"fake serial device at {os.ttyname(slave)}", flush=True)
+    try:
+        while True:
+            if args.stall:
+                time.sleep(1)
+                continue
+            data = os.read(master, 1024)
+            print(f"{time.strftime('%H:%M:%S')} {data!r}", flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import cv2
+
+
+class TemplateTracker:
+    # Follows the boxes from the last detection by template matching inside a
+    # search window around each box. update() returns None when a box is lost
+    # or drifts too far, which tells the caller to run the cascade again.
+    def __init__(self, search_margin=0.5, min_score=0.6, max_shift=0.5):
+        self.search_margin = search_margin
+        self.min_score = min_score
+        self.max_shift = max_shift
+        self.templates = []
+
+    def start(self, gray, boxes):
+        self.templates = [
+            ((x, y, w, h), gray[y : y + h, x : x + w].copy()) for x, y, w, h in boxes
+        ]
+
+    def reset(self):
+        self.templates = []
+
+    def update(self, gray):
+        height, width = gray.shape[:2]
+        boxes = []
+        for (x, y, w, h), template in self.templates:
+            margin_x = int(w * self.search_margin)
+            margin_y = int(h * self.search_margin)
+            left = max(0, x - margin_x)
+            top = max(0, y - margin_y)
+            right = min(width, x + w + margin_x)
+            bottom = min(height, y + h + margin_y)
+            if right - left < w or bottom - top < h:
+                return None
+
+            scores = cv2.matchTemplate(
+                gray[top:bottom, left:right], template, cv2.TM_CCOEFF_NORMED
+            )
+            _, score, _, (match_x, match_y) = cv2.minMaxLoc(scores)
+            new_x, new_y = left + match_x, top + match_y
+            if score < self.min_score:
+                return None
+            if (
+                abs(new_x - x) > self.max_shift * w
+                or abs(new_y - y) > self.max_shift * h
+            ):
+                return None
+            boxes.append((new_x, new_y, w, h))
+
+        return boxes